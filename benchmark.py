@@ -0,0 +1,280 @@
+"""
+Micro-benchmarks for the matrix control path.
+
+Run with `python benchmark.py`. The controller benchmarks drive a real
+MatrixController against the local `emulator`, so they need no hardware.
+"""
+import argparse
+import asyncio
+import json
+import random
+import tempfile
+import time
+import timeit
+from pathlib import Path
+
+import protocol
+from config_manager import ConfigManager
+from emulator import MatrixEmulator
+from http_api import ApiServer
+from matrix_controller import MatrixController
+
+
+def legacy_encode(string_data):
+    """The original per-byte UTF-16 stripping encoder, kept as the benchmark baseline."""
+    bytes_data = string_data.encode('utf-16')
+    bytes2 = bytearray(len(bytes_data) // 2)
+    for b in range(len(bytes2)):
+        bytes2[b] = bytes_data[b * 2]
+    return bytes(bytes2)
+
+
+def _command_space(num_inputs=16, num_outputs=16, num_presets=32):
+    commands = [("route", i, o) for i in range(1, num_inputs + 1) for o in range(1, num_outputs + 1)]
+    commands += [("all", i) for i in range(1, num_inputs + 1)]
+    commands += [("recall", p) for p in range(1, num_presets + 1)]
+    commands += [("save", p) for p in range(1, num_presets + 1)]
+    commands.append(("one_to_one",))
+    return commands
+
+
+def bench_codec(repeat=5, number=20):
+    """Compares the per-command encode cost of the legacy encoder and the protocol codec."""
+    commands = _command_space()
+    texts = [protocol.command_bytes(command).decode("ascii") for command in commands]
+    for command, text in zip(commands, texts):
+        assert legacy_encode(text) == protocol.packet(command), command
+
+    def run_legacy():
+        for text in texts:
+            legacy_encode(text)
+
+    def run_codec():
+        for command in commands:
+            protocol.packet(command)
+
+    def run_encode():
+        for text in texts:
+            protocol.encode(text)
+
+    results = {}
+    for name, func in (("legacy utf-16 loop", run_legacy), ("codec encode()", run_encode), ("codec packet()", run_codec)):
+        best = min(timeit.repeat(func, repeat=repeat, number=number))
+        results[name] = best / (number * len(commands)) * 1e9
+    return results
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(pct / 100 * len(ordered)))]
+
+
+def _wait_for(emulator, count, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while len(emulator.log) < count and time.monotonic() < deadline:
+        time.sleep(0.001)
+
+
+def bench_controller(num_commands=100, loss=0.0, latency=0.0):
+    """
+    Sends `num_commands` individual routes and one full sync through MatrixController
+    to a local emulator. Returns throughput, latency percentiles (send to the
+    emulator applying the command) and the full-sync wall time.
+    """
+    routes = [((n % 16) + 1, (n // 16 % 16) + 1) for n in range(num_commands)]
+    with MatrixEmulator(loss=loss, latency=latency) as emulator:
+        controller = MatrixController(*emulator.address)
+        sent_at = []
+        start = time.perf_counter()
+        for input_num, output_num in routes:
+            sent_at.append(time.monotonic())
+            controller.route(input_num, output_num)
+        elapsed = time.perf_counter() - start
+        _wait_for(emulator, len(routes))
+        # Routes are unique for up to 256 commands, so arrivals can be matched by command.
+        arrivals = {command: arrival for arrival, command in emulator.log}
+        latencies = [
+            (arrivals[("route", input_num, output_num)] - sent) * 1000
+            for sent, (input_num, output_num) in zip(sent_at, routes)
+            if ("route", input_num, output_num) in arrivals
+        ]
+        applied = len(emulator.log)
+
+        desired = {output_num: (output_num % 16) + 1 for output_num in range(1, 17)}
+        controller.known_state = {}
+        start = time.perf_counter()
+        controller.sync(desired)
+        sync_elapsed = time.perf_counter() - start
+        _wait_for(emulator, len(routes) + len(desired))
+        controller.close()
+
+        return {
+            "commands": len(routes),
+            "applied": applied,
+            "commands_per_sec": len(routes) / elapsed,
+            "latency_p50_ms": percentile(latencies, 50) if latencies else None,
+            "latency_p95_ms": percentile(latencies, 95) if latencies else None,
+            "latency_p99_ms": percentile(latencies, 99) if latencies else None,
+            "full_sync_ms": sync_elapsed * 1000,
+            "full_sync_correct": emulator.snapshot() == desired,
+        }
+
+
+def _burst_is_lossless(device_gap, packet_gap, burst):
+    """Sends `burst` back-to-back routes paced by `packet_gap`; True if the emulated device took them all."""
+    with MatrixEmulator(min_gap=device_gap) as emulator:
+        controller = MatrixController(*emulator.address, min_packet_gap=packet_gap)
+        for n in range(burst):
+            controller.route((n % 16) + 1, (n // 16 % 16) + 1)
+        _wait_for(emulator, burst, timeout=0.5)
+        controller.close()
+        return emulator.packets_dropped == 0 and len(emulator.log) == burst
+
+
+def bench_pacing(device_gap=0.01, burst=20, resolution=0.0005):
+    """
+    Finds the smallest `min_packet_gap` that gets a burst of `burst` routes through
+    an emulated device needing `device_gap` seconds between datagrams without loss,
+    by bisection. Also reports what an isolated route and the burst cost with that
+    gap, against the fixed 50 ms sleep per datagram the controller used to do.
+    """
+    low, high = 0.0, max(device_gap * 2, resolution)
+    while not _burst_is_lossless(device_gap, high, burst):
+        high *= 2
+    while high - low > resolution:
+        middle = (low + high) / 2
+        if _burst_is_lossless(device_gap, middle, burst):
+            high = middle
+        else:
+            low = middle
+    # A little headroom over the edge, as a device profile would use.
+    gap = high * 1.1
+    with MatrixEmulator(min_gap=device_gap) as emulator:
+        controller = MatrixController(*emulator.address, min_packet_gap=gap)
+        start = time.perf_counter()
+        controller.route(1, 1)
+        isolated = time.perf_counter() - start
+        time.sleep(gap)
+        start = time.perf_counter()
+        for n in range(burst):
+            controller.route((n % 16) + 1, (n // 16 % 16) + 1)
+        burst_elapsed = time.perf_counter() - start
+        _wait_for(emulator, burst + 1)
+        controller.close()
+        lossless = emulator.packets_dropped == 0
+    return {
+        "device_gap_ms": device_gap * 1000,
+        "fastest_lossless_gap_ms": high * 1000,
+        "configured_gap_ms": gap * 1000,
+        "lossless_at_configured": lossless,
+        "isolated_route_ms": isolated * 1000,
+        "isolated_route_fixed_ms": isolated * 1000 + 50,
+        "burst_ms": burst_elapsed * 1000,
+        "burst_fixed_sleep_ms": burst * 50.0,
+    }
+
+
+async def _http_client(host, port, requests, latencies):
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        for path, payload in requests:
+            body = json.dumps(payload).encode("utf-8")
+            start = time.perf_counter()
+            writer.write(
+                f"POST {path} HTTP/1.1\r\nHost: {host}\r\nContent-Type: application/json\r\n"
+                f"Content-Length: {len(body)}\r\n\r\n".encode("latin-1") + body
+            )
+            await writer.drain()
+            status_line = await reader.readline()
+            length = 0
+            while True:
+                line = await reader.readline()
+                if line in (b"\r\n", b""):
+                    break
+                name, _, value = line.decode("latin-1").partition(":")
+                if name.lower() == "content-length":
+                    length = int(value)
+            await reader.readexactly(length)
+            if b" 200 " not in status_line:
+                raise RuntimeError(f"{path} failed: {status_line!r}")
+            latencies.append((time.perf_counter() - start) * 1000)
+    finally:
+        writer.close()
+
+
+def bench_http_api(clients=200, requests_per_client=5, seed=1):
+    """
+    Runs the HTTP API against a local emulator and drives it with `clients`
+    concurrent keep-alive connections, each sending `requests_per_client` routes.
+    Returns request throughput, latency percentiles, how far the single writer
+    coalesced the requests, and whether the emulator ended in the API's state.
+    """
+    rng = random.Random(seed)
+    workload = [
+        [("/route", {"input": rng.randint(1, 16), "output": rng.randint(1, 16)}) for _ in range(requests_per_client)]
+        for _ in range(clients)
+    ]
+    with MatrixEmulator() as emulator, tempfile.TemporaryDirectory() as config_dir:
+        config_manager = ConfigManager(Path(config_dir) / "config.json", Path(config_dir) / "names.json")
+        controller = MatrixController(*emulator.address)
+        server = ApiServer(controller, config_manager, port=0)
+        server.start()
+        host, port = server.address
+        latencies = []
+
+        async def drive():
+            await asyncio.gather(*[_http_client(host, port, requests, latencies) for requests in workload])
+
+        start = time.perf_counter()
+        asyncio.run(drive())
+        elapsed = time.perf_counter() - start
+        _wait_for(emulator, 1)
+        time.sleep(0.1)
+        server.stop(timeout=2)
+        controller.close()
+        config_manager.flush()
+        routing = dict(config_manager.output_mappings)
+        return {
+            "requests": len(latencies),
+            "requests_per_sec": len(latencies) / elapsed,
+            "latency_p50_ms": percentile(latencies, 50),
+            "latency_p95_ms": percentile(latencies, 95),
+            "latency_p99_ms": percentile(latencies, 99),
+            "matrix_commands": server.commands_executed,
+            "packets_sent": controller.packets_sent,
+            "state_correct": {o: emulator.snapshot()[o] for o in routing} == routing,
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the matrix control path.")
+    parser.add_argument("--commands", type=int, default=100, help="Routes to send in the controller benchmark")
+    parser.add_argument("--loss", type=float, default=0.0, help="Emulated packet loss probability")
+    parser.add_argument("--latency", type=float, default=0.0, help="Emulated device latency in seconds")
+    parser.add_argument("--codec-only", action="store_true", help="Only run the encoder micro-benchmark")
+    parser.add_argument("--http-clients", type=int, default=200, help="Concurrent clients in the HTTP API load test")
+    parser.add_argument("--device-gap", type=float, default=0.01,
+                        help="Emulated device's minimum gap between datagrams, in seconds, for the pacing benchmark")
+    args = parser.parse_args()
+
+    print("Encode cost per command:")
+    for name, ns in bench_codec().items():
+        print(f"  {name:<20} {ns:8.1f} ns")
+    if args.codec_only:
+        return
+
+    print("Controller against the emulator:")
+    for name, value in bench_controller(args.commands, args.loss, args.latency).items():
+        print(f"  {name:<20} {value:.2f}" if isinstance(value, float) else f"  {name:<20} {value}")
+
+    print(f"Pacing against a device needing {args.device_gap * 1000:.1f} ms between datagrams:")
+    for name, value in bench_pacing(args.device_gap).items():
+        print(f"  {name:<26} {value:.2f}" if isinstance(value, float) else f"  {name:<26} {value}")
+
+    print(f"HTTP API with {args.http_clients} concurrent clients against the emulator:")
+    for name, value in bench_http_api(args.http_clients).items():
+        print(f"  {name:<20} {value:.2f}" if isinstance(value, float) else f"  {name:<20} {value}")
+
+
+if __name__ == "__main__":
+    main()
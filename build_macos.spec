@@ -2,7 +2,7 @@ a = Analysis(
     ['main.py'],
     pathex=[],
     binaries=[],
-    datas=[('styles/dark_theme.qss', 'styles')],
+    datas=[('styles/base.qss', 'styles'), ('styles/dark_theme.qss', 'styles')],
     hiddenimports=[],
     hookspath=[],
     hooksconfig={},
@@ -0,0 +1,353 @@
+"""
+A publish/subscribe feed of routing, preset and connection changes, so several
+operator consoles (and tally tools) can share one matrix without drifting apart.
+
+One owner process holds the MatrixController and runs a `ChangeFeedPublisher`.
+Subscribers connect over TCP and receive JSON lines:
+
+    {"type": "snapshot", "seq": 7, "routing": {"<out>": <in>}, "connected": true, "preset": 4, "matrix": {...}}
+    {"type": "routing", "seq": 8, "changes": {"<out>": <in or null>}}
+    {"type": "preset", "seq": 9, "preset": 4, "action": "recall"}
+    {"type": "connection", "seq": 10, "connected": false}
+
+A snapshot is sent when a subscriber connects and whenever it fell too far
+behind; after that it only receives deltas. Subscribers send commands back as
+`{"type": "command", "step": {...}}` lines, where the step has the same form as
+a macro step (see `macros`), and the owner runs them on its controller.
+
+Run `python change_feed.py --host OWNER` to print the feed, e.g. to drive a tally light.
+"""
+import argparse
+import asyncio
+import json
+import socket
+import threading
+
+DEFAULT_FEED_PORT = 20108
+
+
+class ChangeFeedPublisher:
+    """
+    Publishes changes to every connected subscriber from one asyncio event loop
+    on a background thread.
+
+    Routing changes are picked up from the shared RoutingState through a listener
+    and batched per loop tick. Each subscriber has its own bounded queue; when a
+    slow subscriber's queue is full its backlog is dropped and replaced by a
+    single fresh snapshot, so the publisher never waits for anyone.
+    `on_command(step)` is called on the feed thread for commands from subscribers.
+    """
+
+    def __init__(self, routing, host="127.0.0.1", port=DEFAULT_FEED_PORT, queue_size=256,
+                 on_command=None, matrix=None):
+        self.routing = routing
+        self.host = host
+        self.port = port
+        self.queue_size = queue_size
+        self.on_command = on_command
+        self.matrix = matrix or {}
+        self.connected = None
+        self.preset = None
+        self.seq = 0
+        self.resyncs = 0
+        self._subscribers = set()
+        self._pending = {}
+        self._pending_lock = threading.Lock()
+        self._flush_scheduled = False
+        self._loop = None
+        self._server = None
+        self._thread = None
+        self._started = threading.Event()
+
+    @property
+    def address(self):
+        return self._server.sockets[0].getsockname()[:2]
+
+    def subscriber_count(self):
+        return len(self._subscribers)
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run_thread, name="change-feed", daemon=True)
+        self._thread.start()
+        self._started.wait(5)
+        if self._server is not None:
+            self.routing.add_listener(self._on_routing_changed)
+
+    def stop(self, timeout=None):
+        if self._server is None:
+            return
+        self.routing.remove_listener(self._on_routing_changed)
+        self._loop.call_soon_threadsafe(self._server.close)
+        self._thread.join(timeout)
+
+    def publish_connection(self, connected):
+        """Publishes a connection status change. Safe to call from any thread."""
+        self._call_soon(self._publish_connection, connected)
+
+    def publish_preset(self, preset_num, action):
+        """Publishes a preset "recall" or "store". Safe to call from any thread."""
+        self._call_soon(self._publish_preset, preset_num, action)
+
+    def _call_soon(self, func, *args):
+        if self._loop is not None and not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(func, *args)
+
+    def _run_thread(self):
+        try:
+            asyncio.run(self._serve())
+        except asyncio.CancelledError:
+            pass
+        except OSError as e:
+            print(f"Change feed failed to start on {self.host}:{self.port}: {e}")
+            self._started.set()
+
+    async def _serve(self):
+        self._loop = asyncio.get_running_loop()
+        server = await asyncio.start_server(self._handle_subscriber, self.host, self.port)
+        self._server = server
+        self._started.set()
+        async with server:
+            await server.serve_forever()
+
+    # Publishing, on the feed thread
+
+    def _on_routing_changed(self, output_num, input_num):
+        # Called on whichever thread changed the routing; changes are batched per loop tick.
+        with self._pending_lock:
+            self._pending[output_num] = input_num
+            if self._flush_scheduled:
+                return
+            self._flush_scheduled = True
+        self._call_soon(self._flush_routing)
+
+    def _flush_routing(self):
+        with self._pending_lock:
+            changes, self._pending = self._pending, {}
+            self._flush_scheduled = False
+        if changes:
+            self._broadcast({"type": "routing", "changes": {str(o): i for o, i in changes.items()}})
+
+    def _publish_connection(self, connected):
+        self.connected = connected
+        self._broadcast({"type": "connection", "connected": connected})
+
+    def _publish_preset(self, preset_num, action):
+        if action == "recall":
+            self.preset = preset_num
+        self._broadcast({"type": "preset", "preset": preset_num, "action": action})
+
+    def _broadcast(self, message):
+        self.seq += 1
+        message["seq"] = self.seq
+        for subscriber in self._subscribers:
+            try:
+                subscriber.put_nowait(message)
+            except asyncio.QueueFull:
+                # Too far behind: drop the backlog and send the current state instead.
+                while not subscriber.empty():
+                    subscriber.get_nowait()
+                subscriber.put_nowait(None)
+                self.resyncs += 1
+
+    def _snapshot(self):
+        return {
+            "type": "snapshot",
+            "seq": self.seq,
+            "routing": self.routing.to_json(),
+            "connected": self.connected,
+            "preset": self.preset,
+            "matrix": self.matrix,
+        }
+
+    async def _handle_subscriber(self, reader, writer):
+        queue = asyncio.Queue(self.queue_size)
+        queue.put_nowait(None)  # None stands for "send a snapshot".
+        self._subscribers.add(queue)
+        sender = asyncio.ensure_future(self._send_loop(queue, writer))
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    message = json.loads(line)
+                except ValueError:
+                    continue
+                if isinstance(message, dict) and message.get("type") == "command" and self.on_command:
+                    self.on_command(message.get("step", {}))
+        except ConnectionError:
+            pass
+        finally:
+            self._subscribers.discard(queue)
+            sender.cancel()
+            writer.close()
+
+    async def _send_loop(self, queue, writer):
+        try:
+            while True:
+                message = await queue.get()
+                if message is None:
+                    message = self._snapshot()
+                writer.write(json.dumps(message, separators=(",", ":")).encode("utf-8") + b"\n")
+                await writer.drain()
+        except ConnectionError:
+            pass
+
+
+class ChangeFeedSubscriber:
+    """
+    Connects to a publisher from a background thread and calls `on_message(message)`
+    for every line received there, reconnecting after `reconnect_delay` seconds if
+    the owner goes away. `on_disconnect()` is called whenever the connection drops.
+    """
+
+    def __init__(self, host, port=DEFAULT_FEED_PORT, on_message=None, on_disconnect=None, reconnect_delay=1.0):
+        self.host = host
+        self.port = port
+        self.on_message = on_message
+        self.on_disconnect = on_disconnect
+        self.reconnect_delay = reconnect_delay
+        self._sock = None
+        self._send_lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="change-feed-subscriber", daemon=True)
+
+    @property
+    def connected(self):
+        return self._sock is not None
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self, timeout=None):
+        self._stopped.set()
+        sock = self._sock
+        if sock is not None:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+        self._thread.join(timeout)
+
+    def wait(self, timeout=None):
+        """Blocks until the subscriber is stopped."""
+        self._thread.join(timeout)
+
+    def send_command(self, step):
+        """Asks the owner to run one step (see `macros`). Raises ConnectionError if not connected."""
+        line = json.dumps({"type": "command", "step": step}).encode("utf-8") + b"\n"
+        with self._send_lock:
+            if self._sock is None:
+                raise ConnectionError(f"Not connected to the change feed at {self.host}:{self.port}")
+            self._sock.sendall(line)
+
+    def _run(self):
+        while not self._stopped.is_set():
+            try:
+                sock = socket.create_connection((self.host, self.port), timeout=self.reconnect_delay)
+            except OSError:
+                self._stopped.wait(self.reconnect_delay)
+                continue
+            sock.settimeout(None)
+            self._sock = sock
+            try:
+                with sock, sock.makefile("r", encoding="utf-8") as lines:
+                    for line in lines:
+                        try:
+                            message = json.loads(line)
+                        except ValueError:
+                            continue
+                        if self.on_message:
+                            self.on_message(message)
+            except OSError:
+                pass
+            finally:
+                with self._send_lock:
+                    self._sock = None
+            if self.on_disconnect:
+                self.on_disconnect()
+            self._stopped.wait(self.reconnect_delay)
+
+
+class RemoteController:
+    """
+    Stands in for MatrixController on a subscriber console: every operation is
+    sent to the owner as a command, and the owner's feed reports the result.
+    """
+
+    def __init__(self, subscriber, num_inputs=16, num_outputs=16):
+        self.subscriber = subscriber
+        self.num_inputs = num_inputs
+        self.num_outputs = num_outputs
+        # Updated from the owner's snapshot, so health probes go to the real matrix.
+        self.ip_address = subscriber.host
+        self.port = subscriber.port
+        self.known_state = {}
+        self.packets_sent = 0
+        self.journal = None
+
+    def route(self, input_port, output_port):
+        self.subscriber.send_command({"op": "route", "input": input_port, "outputs": [output_port]})
+        return f"Routing Input {input_port} to Output {output_port}"
+
+    def route_many(self, mapping):
+        by_input = {}
+        for output_port, input_port in mapping.items():
+            by_input.setdefault(input_port, []).append(output_port)
+        for input_port, outputs in by_input.items():
+            self.subscriber.send_command({"op": "route", "input": input_port, "outputs": outputs})
+        return f"Routing {len(mapping)} outputs"
+
+    def sync(self, desired, current=None):
+        changes = {o: i for o, i in desired.items() if (current or {}).get(o) != i}
+        if not changes:
+            return "Matrix already in sync"
+        self.route_many(changes)
+        return f"Synced {len(changes)} outputs through the owner console"
+
+    def route_all(self, input_port):
+        self.subscriber.send_command({"op": "all", "input": input_port})
+
+    def route_1_to_1(self):
+        self.subscriber.send_command({"op": "one_to_one"})
+
+    def recall_preset(self, preset_num):
+        self.subscriber.send_command({"op": "recall", "preset": preset_num})
+        return f"Recalling Preset {preset_num}"
+
+    def store_preset(self, preset_num):
+        self.subscriber.send_command({"op": "store", "preset": preset_num})
+        return f"Storing Preset {preset_num}"
+
+    def set_endpoint(self, ip_address, port, min_packet_gap=None):
+        """The owner decides which matrix is controlled; nothing to do here."""
+
+    def query_state(self, timeout=0.5, idle=0.05):
+        return None
+
+    def check_connection(self, timeout=1.0):
+        return self.subscriber.connected
+
+    def close(self):
+        self.subscriber.stop(timeout=1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Print the routing change feed of an owner console.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_FEED_PORT)
+    args = parser.parse_args()
+    subscriber = ChangeFeedSubscriber(
+        args.host, args.port,
+        on_message=lambda message: print(json.dumps(message), flush=True),
+        on_disconnect=lambda: print("Disconnected; reconnecting...", flush=True),
+    )
+    subscriber.start()
+    try:
+        subscriber.wait()
+    except KeyboardInterrupt:
+        subscriber.stop(timeout=1)
+
+
+if __name__ == "__main__":
+    main()
@@ -16,5 +16,6 @@ def get_config_dir():
 CONFIG_DIR = get_config_dir()
 CONFIG_FILE = CONFIG_DIR / "config.json"
 NAMES_FILE = CONFIG_DIR / "names.json"
+JOURNAL_DIR = CONFIG_DIR / "journal"
 
 CONFIG_DIR.mkdir(parents=True, exist_ok=True)
@@ -1,15 +1,76 @@
+import atexit
 import json
+import os
 import shutil
+import tempfile
+import threading
+import time
 from pathlib import Path
 import sys
 
+import metrics
+import tracing
+from routing_state import RoutingState
+
+CONFIG_WRITES = metrics.counter("hdmi_matrix_config_writes_total", "Config files written, by file", ("file",))
+CONFIG_WRITE_ERRORS = metrics.counter("hdmi_matrix_config_write_errors_total", "Config file writes that failed", ("file",))
+CONFIG_SAVE_DURATION = metrics.histogram("hdmi_matrix_config_save_duration_seconds", "Time to write one config file")
+
+
+# The process umask, read once at import: os.umask can only be read by setting it,
+# which is not safe to do while other threads create files.
+_UMASK = os.umask(0o022)
+os.umask(_UMASK)
+
+# Seconds before a failed background write is retried.
+SAVE_RETRY_DELAY = 5.0
+
+
+def write_json_atomic(path, data):
+    """
+    Writes `data` as JSON to a temporary file next to `path` and atomically renames it
+    into place. The file keeps the mode of the file it replaces (or gets the umask
+    default for a new file), not mkstemp's 0600.
+    """
+    path = Path(path)
+    try:
+        mode = path.stat().st_mode & 0o777
+    except FileNotFoundError:
+        mode = 0o666 & ~_UMASK
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=4)
+            f.flush()
+            os.fsync(f.fileno())
+        os.chmod(tmp_path, mode)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
 class ConfigManager:
-    def __init__(self, config_file_path, names_file_path):
+    def __init__(self, config_file_path, names_file_path, save_delay=0.5):
         self.CONFIG_FILE = config_file_path
         self.NAMES_FILE = names_file_path
         self.settings = {}
         self.names = {}
-        self.output_mappings = {}
+        # The one routing state shared by the whole app; it is updated in place, never rebound.
+        self.output_mappings = RoutingState()
+        # Write-behind persistence: changes mark a file dirty and a single background
+        # write per `save_delay` seconds flushes everything that changed meanwhile.
+        self.save_delay = save_delay
+        self._dirty = set()
+        self._save_timer = None
+        self._save_lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        # Stylesheet text per theme, read from disk once.
+        self._stylesheets = {}
+        atexit.register(self.flush)
         self.migrate_configs()
         self.load_settings()
         self.load_names()
@@ -34,22 +95,125 @@ class ConfigManager:
                 self.settings["confirm_before_switch"] = False
             if "output_mappings" not in self.settings:
                 self.settings["output_mappings"] = {}
+            if "max_datagram_size" not in self.settings:
+                self.settings["max_datagram_size"] = 64
+            if "health_check_interval" not in self.settings:
+                self.settings["health_check_interval"] = 10
+            if "readback_interval" not in self.settings:
+                self.settings["readback_interval"] = 0
+            if "num_inputs" not in self.settings:
+                self.settings["num_inputs"] = 16
+            if "num_outputs" not in self.settings:
+                self.settings["num_outputs"] = 16
+            if "num_presets" not in self.settings:
+                self.settings["num_presets"] = 32
+            if "preset_snapshots" not in self.settings:
+                self.settings["preset_snapshots"] = {}
+            if "api_host" not in self.settings:
+                self.settings["api_host"] = "127.0.0.1"
+            if "api_port" not in self.settings:
+                self.settings["api_port"] = 0
+            if "min_packet_gap_ms" not in self.settings:
+                self.settings["min_packet_gap_ms"] = 50
+            if "tracing" not in self.settings:
+                self.settings["tracing"] = False
+            if "metrics_port" not in self.settings:
+                self.settings["metrics_port"] = 0
+            if "feed_role" not in self.settings:
+                self.settings["feed_role"] = "standalone"
+            if "feed_host" not in self.settings:
+                self.settings["feed_host"] = "127.0.0.1"
+            if "feed_port" not in self.settings:
+                self.settings["feed_port"] = 20108
+            if "macros" not in self.settings:
+                self.settings["macros"] = []
+            if "matrices" not in self.settings:
+                self.settings["matrices"] = [
+                    {"name": "Matrix 1", "ip": self.settings["ip"], "port": self.settings["port"]}
+                ]
         except (FileNotFoundError, json.JSONDecodeError):
-            self.settings = {"ip": "192.168.1.230", "port": 20107, "theme": "dark", "confirm_before_switch": False, "output_mappings": {}}
-            with open(self.CONFIG_FILE, "w", encoding="utf-8") as f:
-                json.dump(self.settings, f, indent=4)
-        self.output_mappings = {int(k): v for k, v in self.settings["output_mappings"].items()}
+            self.settings = {"ip": "192.168.1.230", "port": 20107, "theme": "dark", "confirm_before_switch": False, "output_mappings": {}, "max_datagram_size": 64, "health_check_interval": 10, "readback_interval": 0,
+                             "num_inputs": 16, "num_outputs": 16, "num_presets": 32, "preset_snapshots": {}, "macros": [],
+                             "api_host": "127.0.0.1", "api_port": 0, "metrics_port": 0, "tracing": False, "min_packet_gap_ms": 50,
+                             "feed_role": "standalone", "feed_host": "127.0.0.1", "feed_port": 20108,
+                             "matrices": [{"name": "Matrix 1", "ip": "192.168.1.230", "port": 20107}]}
+            write_json_atomic(self.CONFIG_FILE, self.settings)
+        self.output_mappings.replace({int(k): v for k, v in self.settings["output_mappings"].items()})
 
+    @tracing.traced()
     def save_settings(self, ip, port, confirm_before_switch, output_mappings, theme=None):
+        if (ip, port) != (self.settings["ip"], self.settings["port"]):
+            self._move_primary_matrix(ip, port)
         self.settings["ip"] = ip
         self.settings["port"] = port
         self.settings["confirm_before_switch"] = confirm_before_switch
-        self.settings["output_mappings"] = output_mappings
+        if output_mappings is not self.output_mappings:
+            self.output_mappings.replace({int(k): v for k, v in output_mappings.items()})
+        self.settings["output_mappings"] = self.output_mappings.to_json()
         if theme:
             self.settings["theme"] = theme
-        with open(self.CONFIG_FILE, "w", encoding="utf-8") as f:
-            json.dump(self.settings, f, indent=4)
-        self.output_mappings = {int(k): v for k, v in self.settings["output_mappings"].items()}
+        self.mark_dirty("settings")
+
+    def get_matrices(self):
+        """
+        Returns the configured matrix endpoints as a list of {"name", "ip", "port"} dicts.
+        An entry may also set "min_packet_gap_ms" for a device that needs a different pace.
+        """
+        return self.settings["matrices"]
+
+    def set_matrices(self, matrices):
+        self.settings["matrices"] = [
+            {"name": m["name"], "ip": m["ip"], "port": int(m["port"]),
+             **({"min_packet_gap_ms": m["min_packet_gap_ms"]} if "min_packet_gap_ms" in m else {})}
+            for m in matrices
+        ]
+        self.mark_dirty("settings")
+
+    def _move_primary_matrix(self, ip, port):
+        """
+        Keeps the `matrices` entry of the default endpoint in step when the endpoint
+        changes, so the fleet keeps including the matrix the app controls. Switching to
+        an endpoint that is already configured leaves the list alone.
+        """
+        matrices = self.settings["matrices"]
+        if any((m["ip"], m["port"]) == (ip, port) for m in matrices):
+            return
+        for matrix in matrices:
+            if (matrix["ip"], matrix["port"]) == (self.settings["ip"], self.settings["port"]):
+                matrix["ip"], matrix["port"] = ip, port
+                return
+        matrices.insert(0, {"name": f"Matrix {len(matrices) + 1}", "ip": ip, "port": port})
+
+    def get_packet_gap(self, ip, port):
+        """Returns the minimum inter-packet gap in seconds for a matrix endpoint."""
+        for matrix in self.settings["matrices"]:
+            if (matrix["ip"], matrix["port"]) == (ip, port) and "min_packet_gap_ms" in matrix:
+                return matrix["min_packet_gap_ms"] / 1000
+        return self.settings["min_packet_gap_ms"] / 1000
+
+    def get_preset_snapshot(self, preset_num):
+        """Returns the routing (output -> input) stored to a preset from this app, or None if unknown."""
+        snapshot = self.settings["preset_snapshots"].get(str(preset_num))
+        if snapshot is None:
+            return None
+        return {int(k): v for k, v in snapshot.items()}
+
+    @tracing.traced()
+    def set_preset_snapshot(self, preset_num, routing):
+        """Remembers what a preset contains, so it can be previewed and recalled without the device."""
+        self.settings["preset_snapshots"][str(preset_num)] = {str(k): v for k, v in routing.items()}
+        self.mark_dirty("settings")
+
+    def set_feed_settings(self, role, host, port):
+        """Sets this console's change-feed role ("standalone", "owner" or "subscriber") and address."""
+        self.settings["feed_role"] = role
+        self.settings["feed_host"] = host
+        self.settings["feed_port"] = int(port)
+        self.mark_dirty("settings")
+
+    def get_macros(self):
+        """Returns the macro definitions (see `macros`) as a list of {"name", "steps"} dicts."""
+        return self.settings["macros"]
 
     def load_names(self):
         try:
@@ -61,20 +225,85 @@ class ConfigManager:
                 "current_preset": "default",
             }
 
+    @tracing.traced()
     def save_names(self):
-        with open(self.NAMES_FILE, "w") as f:
-            json.dump(self.names, f, indent=4)
+        self.mark_dirty("names")
+
+    def mark_dirty(self, which):
+        """Schedules a background write of "settings" or "names", coalescing rapid changes."""
+        with self._save_lock:
+            self._dirty.add(which)
+            self._schedule_flush(self.save_delay)
+
+    def _schedule_flush(self, delay):
+        """Starts the save timer unless one is pending. Called with the save lock held."""
+        if self._save_timer is None:
+            self._save_timer = threading.Timer(delay, self.flush)
+            self._save_timer.daemon = True
+            self._save_timer.start()
+
+    @tracing.traced()
+    def flush(self):
+        """Writes every dirty file now. Called by the save timer and on shutdown."""
+        with self._save_lock:
+            dirty, self._dirty = self._dirty, set()
+            if self._save_timer is not None:
+                self._save_timer.cancel()
+                self._save_timer = None
+            # The GUI keeps mutating these dicts while we write, so take a snapshot first.
+            # A compact json.dumps runs entirely in the C encoder and cannot interleave with it.
+            snapshots = {}
+            if "settings" in dirty:
+                settings = json.loads(json.dumps(self.settings))
+                # When the routing was saved, so startup recovers only journal entries newer than this.
+                settings["saved_at"] = time.time()
+                snapshots["settings"] = (self.CONFIG_FILE, settings)
+            if "names" in dirty:
+                snapshots["names"] = (self.NAMES_FILE, json.loads(json.dumps(self.names)))
+        with self._write_lock:
+            for which, (path, data) in snapshots.items():
+                file_label = Path(path).name
+                start = time.perf_counter()
+                try:
+                    with tracing.span("write_json_atomic", file=file_label):
+                        write_json_atomic(path, data)
+                except OSError:
+                    CONFIG_WRITE_ERRORS.inc(file=file_label)
+                    # Keep the change (and any file not written yet) dirty and try again later.
+                    unwritten = list(snapshots)[list(snapshots).index(which):]
+                    with self._save_lock:
+                        self._dirty.update(unwritten)
+                        self._schedule_flush(SAVE_RETRY_DELAY)
+                    raise
+                CONFIG_SAVE_DURATION.observe(time.perf_counter() - start)
+                CONFIG_WRITES.inc(file=file_label)
+
+    def set_theme(self, theme_name):
+        if self.settings.get("theme") == theme_name:
+            return
+        self.settings["theme"] = theme_name
+        self.mark_dirty("settings")
 
     def get_theme_stylesheet(self, theme_name):
-        if theme_name == "dark":
-            if getattr(sys, 'frozen', False):
-                stylesheet_path = Path(sys._MEIPASS) / "styles" / "dark_theme.qss"
-            else:
-                stylesheet_path = Path("styles/dark_theme.qss")
-            try:
-                with open(stylesheet_path, "r", encoding="utf-8") as f:
-                    return f.read()
-            except FileNotFoundError:
-                print(f"Warning: Stylesheet not found at {stylesheet_path}")
-                return ""
-        return "" # Clear stylesheet for default/light theme
+        """
+        Returns the stylesheet for a theme: the theme's own rules (none for "light")
+        followed by the base rules every theme needs. Cached after the first call.
+        """
+        stylesheet = self._stylesheets.get(theme_name)
+        if stylesheet is None:
+            theme_rules = self._read_stylesheet("dark_theme.qss") if theme_name == "dark" else ""
+            stylesheet = self._stylesheets[theme_name] = theme_rules + "\n" + self._read_stylesheet("base.qss")
+        return stylesheet
+
+    @staticmethod
+    def _read_stylesheet(file_name):
+        if getattr(sys, 'frozen', False):
+            stylesheet_path = Path(sys._MEIPASS) / "styles" / file_name
+        else:
+            stylesheet_path = Path("styles") / file_name
+        try:
+            with open(stylesheet_path, "r", encoding="utf-8") as f:
+                return f.read()
+        except FileNotFoundError:
+            print(f"Warning: Stylesheet not found at {stylesheet_path}")
+            return ""
@@ -0,0 +1,140 @@
+"""
+Finds matrices on the local network, so the app can be pointed at one without
+typing its address (e.g. after a DHCP change).
+
+Every host in a subnet is sent a "Status." query on the control port, and any
+host that answers is reported. A matrix that does not answer status queries (the
+reply format is not verified on every model, see `readback`) cannot be found
+this way; enter its address by hand instead. Probes share one UDP socket and run concurrently
+from an asyncio event loop, with at most `concurrency` of them in flight and a
+global deadline for the whole scan, so a /24 takes about `timeout` seconds
+rather than one timeout per host. The deadline defaults to what the subnet needs
+at that concurrency; a scan cut short by it is reported as incomplete.
+
+    python -m hdmi_matrix discover --network 192.168.1.0/24
+"""
+import asyncio
+import collections
+import ipaddress
+import math
+import socket
+import threading
+import time
+
+import protocol
+
+DEFAULT_CONTROL_PORT = 20107
+# Refuse scans larger than a /16; anything bigger is almost certainly a typo.
+MAX_HOSTS = 65536
+# Seconds of event-loop work per probe, allowed for when scaling the default deadline.
+PROBE_OVERHEAD = 0.0002
+
+DiscoveredMatrix = collections.namedtuple("DiscoveredMatrix", "ip port outputs rtt_ms")
+
+
+class ScanResult(collections.namedtuple("ScanResult", "matrices probed hosts")):
+    """The matrices found, and how many of the subnet's hosts were probed before the deadline."""
+
+    @property
+    def complete(self):
+        return self.probed == self.hosts
+
+
+def local_network(prefix=24):
+    """Returns the /`prefix` network of this machine's LAN address, e.g. "192.168.1.0/24"."""
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+        try:
+            # Connecting a UDP socket sends nothing; it only picks the outgoing interface.
+            sock.connect(("10.255.255.255", 1))
+            address = sock.getsockname()[0]
+        except OSError:
+            address = "127.0.0.1"
+    return str(ipaddress.ip_network(f"{address}/{prefix}", strict=False))
+
+
+def network_hosts(network):
+    """Returns the host addresses of a network such as "192.168.1.0/24" (or a single address)."""
+    network = ipaddress.ip_network(network, strict=False)
+    if network.num_addresses > MAX_HOSTS:
+        raise ValueError(f"{network} has too many addresses to scan; use a /16 or smaller")
+    return [str(host) for host in network.hosts()]
+
+
+class _ReplyProtocol(asyncio.DatagramProtocol):
+    """Hands every reply datagram to the probe waiting on its source address."""
+
+    def __init__(self):
+        self.waiting = {}
+
+    def datagram_received(self, data, address):
+        future = self.waiting.get(address[:2])
+        if future is not None and not future.done():
+            future.set_result(data)
+
+    def error_received(self, exc):
+        pass  # ICMP errors for hosts that are not there; their probes simply time out.
+
+
+async def discover(network, port=DEFAULT_CONTROL_PORT, concurrency=256, timeout=0.5, deadline=None):
+    """
+    Probes every host in `network` and returns a ScanResult listing a DiscoveredMatrix
+    for each one that answered the status query, sorted by address. Each probe waits
+    at most `timeout` seconds. The scan stops after `deadline` seconds (by default
+    long enough for every host at this concurrency) with whatever was found.
+    """
+    hosts = network_hosts(network)
+    if deadline is None:
+        # One timeout per wave of probes, plus an allowance for the per-probe overhead.
+        deadline = math.ceil(len(hosts) / concurrency) * timeout + len(hosts) * PROBE_OVERHEAD + 1.0
+    loop = asyncio.get_running_loop()
+    transport, replies = await loop.create_datagram_endpoint(_ReplyProtocol, family=socket.AF_INET)
+    semaphore = asyncio.Semaphore(concurrency)
+    query = protocol.packet(("status",))
+    found = []
+    probed = 0
+
+    async def probe(host):
+        nonlocal probed
+        async with semaphore:
+            future = loop.create_future()
+            replies.waiting[(host, port)] = future
+            start = time.monotonic()
+            try:
+                transport.sendto(query, (host, port))
+                data = await asyncio.wait_for(future, timeout)
+            except (asyncio.TimeoutError, OSError):
+                probed += 1
+                return
+            finally:
+                del replies.waiting[(host, port)]
+            probed += 1
+            rtt_ms = (time.monotonic() - start) * 1000
+            found.append(DiscoveredMatrix(host, port, len(protocol.parse_status(data)), rtt_ms))
+
+    probes = [asyncio.ensure_future(probe(host)) for host in hosts]
+    try:
+        await asyncio.wait(probes, timeout=deadline)
+    finally:
+        for task in probes:
+            task.cancel()
+        await asyncio.gather(*probes, return_exceptions=True)
+        transport.close()
+    return ScanResult(sorted(found, key=lambda matrix: ipaddress.ip_address(matrix.ip)), probed, len(hosts))
+
+
+def discover_in_background(network, port=DEFAULT_CONTROL_PORT, callback=None, **kwargs):
+    """
+    Runs `discover` on a daemon thread and calls `callback(result)` there with its
+    ScanResult, or `callback(exception)` if the scan could not run (e.g. a malformed network).
+    """
+    def run():
+        try:
+            results = asyncio.run(discover(network, port, **kwargs))
+        except (OSError, ValueError) as e:
+            results = e
+        if callback:
+            callback(results)
+
+    thread = threading.Thread(target=run, name="matrix-discovery", daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,62 @@
+"""
+Runs matrix commands on a background worker thread so network I/O never blocks the UI.
+"""
+import queue
+import threading
+import traceback
+
+import metrics
+import tracing
+
+PENDING = metrics.gauge("hdmi_matrix_pending_commands", "Commands queued on the dispatcher")
+COMMAND_FAILURES = metrics.counter("hdmi_matrix_command_failures_total", "Dispatched commands that raised")
+
+
+class CommandDispatcher:
+    """
+    Drains a thread-safe queue of commands on a single worker thread.
+
+    Commands run strictly in submission order. Results are handed to the command's
+    callback through `deliver`, which defaults to calling it on the worker thread;
+    the GUI passes a function that marshals the call onto the Qt event loop instead.
+    """
+
+    def __init__(self, name="matrix-dispatcher", deliver=None, on_error=None):
+        self.deliver = deliver or (lambda func, *args: func(*args))
+        self.on_error = on_error
+        self._queue = queue.Queue()
+        PENDING.set_function(self.pending)
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def submit(self, func, *args, callback=None):
+        """Queues `func(*args)`; `callback(result)` is delivered once it has run."""
+        self._queue.put((func, args, callback))
+
+    def pending(self):
+        """Returns the number of commands waiting to run."""
+        return self._queue.qsize()
+
+    def stop(self, timeout=None):
+        """Lets already queued commands finish, then stops the worker thread."""
+        self._queue.put(None)
+        self._thread.join(timeout)
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            func, args, callback = item
+            try:
+                with tracing.span(getattr(func, "__qualname__", "command"), queued=self._queue.qsize()):
+                    result = func(*args)
+            except Exception as e:
+                COMMAND_FAILURES.inc()
+                if self.on_error:
+                    self.deliver(self.on_error, e)
+                else:
+                    traceback.print_exc()
+                continue
+            if callback:
+                self.deliver(callback, result)
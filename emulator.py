@@ -0,0 +1,151 @@
+"""
+A pure-Python UDP emulator of the HDMI matrix, for benchmarking and regression
+testing the control path without hardware.
+
+Run standalone with `python emulator.py --port 20107` and point the app at it.
+"""
+import argparse
+import heapq
+import random
+import socket
+import threading
+import time
+
+import protocol
+
+
+class MatrixEmulator:
+    """
+    Listens for command datagrams, parses them exactly as MatrixController sends
+    them and keeps the resulting routing and preset state. Status queries are
+    answered with the current routing. Packets can optionally
+    be dropped (`loss`, a probability) or delayed (`latency`, in seconds).
+    With `min_gap` (in seconds) it behaves like a device that is still busy after
+    each datagram: packets arriving sooner than that after the last accepted one
+    are dropped.
+    """
+
+    def __init__(self, host="127.0.0.1", port=0, num_inputs=16, num_outputs=16,
+                 loss=0.0, latency=0.0, seed=None, min_gap=0.0):
+        self.num_inputs = num_inputs
+        self.num_outputs = num_outputs
+        self.loss = loss
+        self.latency = latency
+        self.min_gap = min_gap
+        self._last_accepted = None
+        self.routing = {}
+        self.presets = {}
+        # (arrival time, command) for every command applied, in order.
+        self.log = []
+        self.packets_received = 0
+        self.packets_dropped = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._pending = []
+        self._stopped = False
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.socket.bind((host, port))
+        self._thread = threading.Thread(target=self._run, name="matrix-emulator", daemon=True)
+
+    @property
+    def address(self):
+        return self.socket.getsockname()
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stopped = True
+        self._thread.join(1)
+        self.socket.close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self.routing)
+
+    def apply(self, command):
+        """Applies a single command tuple to the emulated state."""
+        kind = command[0]
+        with self._lock:
+            if kind == "route":
+                input_num, output_num = command[1], command[2]
+                if 1 <= input_num <= self.num_inputs and 1 <= output_num <= self.num_outputs:
+                    self.routing[output_num] = input_num
+            elif kind == "all":
+                if 1 <= command[1] <= self.num_inputs:
+                    self.routing = {o: command[1] for o in range(1, self.num_outputs + 1)}
+            elif kind == "one_to_one":
+                self.routing = {o: o for o in range(1, min(self.num_inputs, self.num_outputs) + 1)}
+            elif kind == "recall":
+                self.routing = dict(self.presets.get(command[1], self.routing))
+            elif kind == "save":
+                self.presets[command[1]] = dict(self.routing)
+
+    def handle_packet(self, data, address, arrival):
+        """Parses one datagram and applies its commands."""
+        for command in protocol.parse_packet(data):
+            if command[0] == "status":
+                self.socket.sendto(protocol.encode_status(self.snapshot()), address)
+                continue
+            self.apply(command)
+            self.log.append((arrival, command))
+
+    def _run(self):
+        while not self._stopped:
+            timeout = 0.05
+            if self._pending:
+                timeout = max(0.0, min(timeout, self._pending[0][0] - time.monotonic()))
+            self.socket.settimeout(timeout)
+            try:
+                data, address = self.socket.recvfrom(2048)
+            except (BlockingIOError, socket.timeout):
+                data = None
+            except OSError:
+                break
+            now = time.monotonic()
+            if data is not None:
+                self.packets_received += 1
+                if self.loss and self._random.random() < self.loss:
+                    self.packets_dropped += 1
+                elif self.min_gap and self._last_accepted is not None and now - self._last_accepted < self.min_gap:
+                    self.packets_dropped += 1
+                elif self.latency:
+                    self._last_accepted = now
+                    heapq.heappush(self._pending, (now + self.latency, self.packets_received, data, address))
+                else:
+                    self._last_accepted = now
+                    self.handle_packet(data, address, now)
+            while self._pending and self._pending[0][0] <= time.monotonic():
+                due, _, data, address = heapq.heappop(self._pending)
+                self.handle_packet(data, address, due)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a local HDMI matrix emulator.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=20107)
+    parser.add_argument("--loss", type=float, default=0.0, help="Probability of dropping a packet")
+    parser.add_argument("--latency", type=float, default=0.0, help="Processing delay in seconds")
+    parser.add_argument("--min-gap", type=float, default=0.0,
+                        help="Drop packets arriving sooner than this many seconds after the last one")
+    args = parser.parse_args()
+    emulator = MatrixEmulator(
+        args.host, args.port, loss=args.loss, latency=args.latency, min_gap=args.min_gap
+    ).start()
+    print(f"Matrix emulator listening on {emulator.address[0]}:{emulator.address[1]}")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        emulator.stop()
+
+
+if __name__ == "__main__":
+    main()
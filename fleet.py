@@ -0,0 +1,93 @@
+"""
+Controls several matrices at once, fanning each operation out to every device in parallel.
+"""
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from matrix_controller import DEFAULT_MIN_PACKET_GAP, MatrixController
+
+FleetResult = namedtuple("FleetResult", ["name", "ok", "result", "error", "elapsed_ms"])
+
+
+class FleetController:
+    """
+    Owns one MatrixController per named matrix endpoint. Fleet operations run on
+    every device concurrently, so a fleet-wide command takes about as long as the
+    slowest single device instead of the sum of all of them.
+    """
+
+    def __init__(self, controllers):
+        self.controllers = dict(controllers)
+        # Name of the matrix driven by the app's own controller, if it is in the fleet.
+        self.primary_name = None
+        self._owned = set()
+        self._executor = ThreadPoolExecutor(
+            max_workers=max(1, len(self.controllers)), thread_name_prefix="fleet"
+        )
+
+    @classmethod
+    def from_endpoints(cls, endpoints, max_datagram_size=64, num_inputs=16, num_outputs=16, primary=None,
+                       min_packet_gap=DEFAULT_MIN_PACKET_GAP):
+        """
+        Builds a fleet from `[{"name", "ip", "port"}, ...]`. An endpoint matching the
+        `primary` controller reuses it instead of opening a second transport. An
+        endpoint's "min_packet_gap_ms" overrides `min_packet_gap` (in seconds).
+        """
+        controllers = {}
+        owned = set()
+        primary_name = None
+        for endpoint in endpoints:
+            name = endpoint["name"]
+            if primary is not None and (endpoint["ip"], endpoint["port"]) == (primary.ip_address, primary.port):
+                controllers[name] = primary
+                primary_name = name
+            else:
+                controllers[name] = MatrixController(
+                    endpoint["ip"], endpoint["port"], max_datagram_size=max_datagram_size,
+                    num_inputs=num_inputs, num_outputs=num_outputs,
+                    min_packet_gap=endpoint["min_packet_gap_ms"] / 1000 if "min_packet_gap_ms" in endpoint else min_packet_gap,
+                )
+                owned.add(name)
+        fleet = cls(controllers)
+        fleet._owned = owned
+        fleet.primary_name = primary_name
+        return fleet
+
+    def run(self, operation, *args):
+        """
+        Calls `controller.<operation>(*args)` on every matrix concurrently and returns
+        one FleetResult per device, in fleet order. Errors are reported per device.
+        """
+        futures = [
+            self._executor.submit(self._call, name, controller, operation, args)
+            for name, controller in self.controllers.items()
+        ]
+        return [future.result() for future in futures]
+
+    @staticmethod
+    def _call(name, controller, operation, args):
+        start = time.monotonic()
+        try:
+            result = getattr(controller, operation)(*args)
+        except Exception as e:
+            return FleetResult(name, False, None, e, (time.monotonic() - start) * 1000)
+        return FleetResult(name, True, result, None, (time.monotonic() - start) * 1000)
+
+    def recall_preset(self, preset_num):
+        return self.run("recall_preset", preset_num)
+
+    def route_1_to_1(self):
+        return self.run("route_1_to_1")
+
+    def route_all(self, input_port):
+        return self.run("route_all", input_port)
+
+    def sync(self, desired):
+        return self.run("sync", dict(desired))
+
+    def close(self):
+        """Closes the transports this fleet opened and stops its worker threads."""
+        for name in self._owned:
+            self.controllers[name].close()
+        self._executor.shutdown(wait=False)
@@ -0,0 +1,292 @@
+"""
+Headless command-line control of the HDMI matrix.
+
+    python -m hdmi_matrix route 3 5          Route input 3 to output 5
+    python -m hdmi_matrix all 3              Route input 3 to every output
+    python -m hdmi_matrix one-to-one         Map every input to the same-numbered output
+    python -m hdmi_matrix recall 4           Recall preset 4
+    python -m hdmi_matrix recall 4 --diff    Recall preset 4 by sending only the outputs that change
+    python -m hdmi_matrix store 4            Store the current routing to preset 4
+    python -m hdmi_matrix sync --from iomap.json
+    python -m hdmi_matrix status
+    python -m hdmi_matrix serve             Run the HTTP control API without the GUI
+    python -m hdmi_matrix macro "Cue 1"     Run a macro from the saved settings
+    python -m hdmi_matrix --metrics route 3 5  Also print the control path metrics as JSON
+    python -m hdmi_matrix history 7 --at 19:42   Show what output 7 was routed to at 19:42 today
+    python -m hdmi_matrix discover --save   Find matrices on the local /24 and save the one found
+
+This module must stay importable without PyQt5: it only uses MatrixController and
+ConfigManager, and it never runs the GUI's startup connectivity check.
+"""
+import argparse
+import asyncio
+import json
+import sys
+from datetime import datetime, time
+
+from config import CONFIG_FILE, JOURNAL_DIR, NAMES_FILE
+from config_manager import ConfigManager
+import discovery
+from health import HealthMonitor
+from http_api import ApiServer
+from journal import RoutingJournal
+import metrics
+from macros import MacroScheduler, step_routing
+from matrix_controller import MatrixController
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="hdmi_matrix", description="Control the HDMI matrix without the GUI.")
+    parser.add_argument("--ip", help="Matrix IP address (defaults to the saved setting)")
+    parser.add_argument("--port", type=int, help="Matrix port (defaults to the saved setting)")
+    parser.add_argument("--matrix", help="Name of a configured matrix to use instead of the default one")
+    parser.add_argument("--metrics", action="store_true", help="Print a JSON snapshot of the control path metrics afterwards")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    route = commands.add_parser("route", help="Route an input to one or more outputs")
+    route.add_argument("input", type=int)
+    route.add_argument("outputs", type=int, nargs="+")
+
+    route_all = commands.add_parser("all", help="Route an input to every output")
+    route_all.add_argument("input", type=int)
+
+    commands.add_parser("one-to-one", help="Map every input to the same-numbered output")
+
+    recall = commands.add_parser("recall", help="Recall a preset")
+    recall.add_argument("preset", type=int)
+    recall.add_argument("--diff", action="store_true",
+                        help="Send only the outputs that differ from the saved routing (needs a stored snapshot)")
+
+    store = commands.add_parser("store", help="Store the current routing to a preset")
+    store.add_argument("preset", type=int)
+
+    sync = commands.add_parser("sync", help="Push a routing map to the matrix")
+    sync.add_argument("--from", dest="iomap", help="I/O map file saved from the GUI (defaults to the saved routing)")
+
+    commands.add_parser("status", help="Check whether the matrix is reachable and show the saved routing")
+
+    serve = commands.add_parser("serve", help="Run the HTTP control API without the GUI")
+    serve.add_argument("--host", dest="api_host", help="Address to listen on (defaults to the api_host setting)")
+    serve.add_argument("--listen-port", dest="api_port", type=int, help="Port to listen on (defaults to the api_port setting, or 8080)")
+
+    macro = commands.add_parser("macro", help="Run a macro from the saved settings and report its step timing")
+    macro.add_argument("name")
+
+    history = commands.add_parser("history", help="Show what an output was routed to at a given time")
+    history.add_argument("output", type=int)
+    history.add_argument("--at", dest="when", type=parse_time, required=True,
+                         help="HH:MM[:SS] today, or YYYY-MM-DD HH:MM[:SS]")
+
+    discover = commands.add_parser("discover", help="Find matrices answering on the control port in a subnet")
+    discover.add_argument("--network", help="Subnet to scan, e.g. 192.168.1.0/24 (defaults to this machine's /24)")
+    discover.add_argument("--timeout", type=float, default=0.5, help="Seconds to wait for each host's reply")
+    discover.add_argument("--save", action="store_true", help="Save the endpoint if exactly one matrix answered")
+    return parser
+
+
+def parse_time(text):
+    """Parses a wall-clock time (today) or a full date and time into a unix timestamp."""
+    try:
+        return datetime.fromisoformat(text).timestamp()
+    except ValueError:
+        pass
+    try:
+        return datetime.combine(datetime.now().date(), time.fromisoformat(text)).timestamp()
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid time: {text!r}")
+
+
+def resolve_endpoint(args, config_manager):
+    settings = config_manager.settings
+    ip, port = settings["ip"], settings["port"]
+    if args.matrix:
+        matches = [m for m in config_manager.get_matrices() if m["name"] == args.matrix]
+        if not matches:
+            raise SystemExit(f"Unknown matrix: {args.matrix}")
+        ip, port = matches[0]["ip"], matches[0]["port"]
+    return args.ip or ip, args.port or port
+
+
+def load_io_map(path):
+    with open(path, "r", encoding="utf-8") as f:
+        loaded_data = json.load(f)
+    if not isinstance(loaded_data, dict) or not isinstance(loaded_data.get("mappings"), dict):
+        raise ValueError("Invalid I/O map file format.")
+    return {int(k): v for k, v in loaded_data["mappings"].items()}
+
+
+def save_mappings(config_manager, output_mappings, is_default=True):
+    if not is_default:
+        return
+    settings = config_manager.settings
+    config_manager.save_settings(
+        settings["ip"], settings["port"], settings["confirm_before_switch"], output_mappings
+    )
+
+
+def run(args):
+    if args.command == "history":
+        return show_history(args)
+    config_manager = ConfigManager(CONFIG_FILE, NAMES_FILE)
+    if args.command == "discover":
+        return discover_matrices(args, config_manager)
+    ip, port = resolve_endpoint(args, config_manager)
+    settings = config_manager.settings
+    controller = MatrixController(
+        ip, port,
+        max_datagram_size=settings["max_datagram_size"],
+        num_inputs=settings["num_inputs"],
+        num_outputs=settings["num_outputs"],
+        min_packet_gap=config_manager.get_packet_gap(ip, port),
+    )
+    # The saved routing, presets and journal belong to the default matrix (the one the
+    # GUI controls); commands to any other matrix must not touch them.
+    is_default = (ip, port) == (settings["ip"], settings["port"])
+    journal = None
+    if is_default:
+        journal = RoutingJournal(JOURNAL_DIR)
+        journal.replay()
+        controller.journal = journal
+    output_mappings = dict(config_manager.output_mappings)
+    try:
+        if args.command == "route":
+            command = controller.route_many({output_num: args.input for output_num in args.outputs})
+            output_mappings.update({output_num: args.input for output_num in args.outputs})
+            save_mappings(config_manager, output_mappings, is_default)
+        elif args.command == "all":
+            controller.route_all(args.input)
+            command = f"Patching Input {args.input} to all outputs"
+            output_mappings.update(controller.known_state)
+            save_mappings(config_manager, output_mappings, is_default)
+        elif args.command == "one-to-one":
+            controller.route_1_to_1()
+            command = "1/1 mapping"
+            output_mappings.update(controller.known_state)
+            save_mappings(config_manager, output_mappings, is_default)
+        elif args.command == "recall":
+            # Preset snapshots are only known for the default matrix.
+            snapshot = config_manager.get_preset_snapshot(args.preset) if is_default else None
+            if args.diff and snapshot is not None:
+                command = f"Preset {args.preset}: {controller.sync(snapshot, output_mappings)}"
+            else:
+                command = controller.recall_preset(args.preset)
+            if snapshot is not None:
+                output_mappings.update(snapshot)
+                save_mappings(config_manager, output_mappings, is_default)
+        elif args.command == "store":
+            command = controller.store_preset(args.preset)
+            if is_default:
+                config_manager.set_preset_snapshot(args.preset, output_mappings)
+        elif args.command == "sync":
+            if args.iomap:
+                output_mappings = load_io_map(args.iomap)
+            command = controller.sync(output_mappings)
+            if args.iomap:
+                save_mappings(config_manager, output_mappings, is_default)
+        elif args.command == "serve":
+            health_monitor = HealthMonitor(controller, interval=settings["health_check_interval"])
+            health_monitor.start()
+            server = ApiServer(
+                controller, config_manager,
+                host=args.api_host or settings["api_host"],
+                port=args.api_port or settings["api_port"] or 8080,
+                health_monitor=health_monitor,
+            )
+            print(f"Serving the HTTP API on {server.host}:{server.port} for matrix {ip}:{port}")
+            try:
+                asyncio.run(server.serve())
+            except KeyboardInterrupt:
+                pass
+            finally:
+                health_monitor.stop()
+            return 0
+        elif args.command == "macro":
+            matches = [m for m in config_manager.get_macros() if m["name"] == args.name]
+            if not matches:
+                raise SystemExit(f"Unknown macro: {args.name}")
+
+            def apply_step(run, index, step, result):
+                # Steps run one at a time on the scheduler thread, so this sees each one in order.
+                snapshot = None
+                if step["op"] == "recall" and is_default:
+                    snapshot = config_manager.get_preset_snapshot(step["preset"])
+                output_mappings.update(step_routing(step, settings["num_inputs"], settings["num_outputs"], snapshot))
+                if step["op"] == "store" and is_default:
+                    config_manager.set_preset_snapshot(step["preset"], output_mappings)
+
+            scheduler = MacroScheduler(controller, on_step=apply_step)
+            macro_run = scheduler.run(matches[0])
+            macro_run.wait()
+            scheduler.stop()
+            for timing in macro_run.timings:
+                print(f"  step {timing.index} {timing.op}: at {timing.scheduled_ms:.0f} ms, "
+                      f"late {timing.late_ms:.2f} ms, took {timing.duration_ms:.1f} ms")
+            command = macro_run.summary()
+            save_mappings(config_manager, output_mappings, is_default)
+        elif args.command == "status":
+            connected = controller.check_connection()
+            print(f"Matrix {ip}:{port}: {'Connected' if connected else 'Disconnected'}")
+            if is_default:
+                for output_num, input_num in sorted(output_mappings.items()):
+                    print(f"  Output {output_num} <-- Input {input_num}")
+            return 0 if connected else 1
+    finally:
+        controller.close()
+        if journal is not None:
+            journal.close()
+        config_manager.flush()
+    print(command)
+    return 0
+
+
+def show_history(args):
+    journal = RoutingJournal(JOURNAL_DIR)
+    input_num = journal.state_at(args.output, args.when)
+    when = datetime.fromtimestamp(args.when).strftime("%Y-%m-%d %H:%M:%S")
+    if input_num is None:
+        print(f"Output {args.output} at {when}: unknown")
+        return 1
+    print(f"Output {args.output} at {when}: Input {input_num}")
+    return 0
+
+
+def discover_matrices(args, config_manager):
+    settings = config_manager.settings
+    network = args.network or discovery.local_network()
+    port = args.port or settings["port"]
+    scan = asyncio.run(discovery.discover(network, port, timeout=args.timeout))
+    found = scan.matrices
+    print(f"Scanned {network} on port {port}: {len(found)} matrix(es) found")
+    if not found:
+        print("Only matrices that answer status queries are found; some models do not, so use --ip instead.")
+    if not scan.complete:
+        print(f"Scan incomplete: only {scan.probed} of {scan.hosts} hosts were probed before the deadline")
+    for matrix in found:
+        print(f"  {matrix.ip}:{matrix.port}  {matrix.outputs} outputs reported, {matrix.rtt_ms:.1f} ms")
+    if not args.save:
+        return 0 if found else 1
+    if len(found) != 1:
+        print("Not saving: pick one with --ip/--port instead." if found else "Nothing to save.")
+        return 1
+    config_manager.save_settings(
+        found[0].ip, found[0].port, settings["confirm_before_switch"], config_manager.output_mappings
+    )
+    config_manager.flush()
+    print(f"Saved {found[0].ip}:{found[0].port} as the matrix endpoint")
+    return 0
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    try:
+        return run(args)
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    finally:
+        if args.metrics:
+            print(metrics.snapshot_json())
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,200 @@
+"""
+In-process reachability probes and a periodic health monitor for the matrix.
+"""
+import collections
+import os
+import socket
+import struct
+import threading
+import time
+
+import metrics
+
+ICMP_ECHO_REQUEST = 8
+ICMP_ECHO_REPLY = 0
+
+PROBES = metrics.counter("hdmi_matrix_probes_total", "Connectivity probes, by result", ("result",))
+PROBE_RTT = metrics.histogram("hdmi_matrix_probe_rtt_seconds", "Round trip time of successful probes")
+CONNECTED = metrics.gauge("hdmi_matrix_connected", "1 if the matrix answered the last probe, 0 if not")
+
+
+def _checksum(data):
+    if len(data) % 2:
+        data += b"\0"
+    total = sum(struct.unpack(f"!{len(data) // 2}H", data))
+    total = (total >> 16) + (total & 0xFFFF)
+    total += total >> 16
+    return ~total & 0xFFFF
+
+
+def _is_echo_reply(data, ident):
+    """
+    Returns True if `data`, as read from an ICMP socket, is an echo reply to our request.
+    Raw sockets, and macOS's unprivileged datagram sockets, deliver the IP header as well;
+    Linux's ping sockets do not, and rewrite the identifier (filtering replies themselves).
+    """
+    has_ip_header = len(data) > 0 and data[0] >> 4 == 4  # No ICMP type starts with 0x4_.
+    if has_ip_header:
+        data = data[(data[0] & 0x0F) * 4:]
+    if len(data) < 8:
+        return False
+    icmp_type, _, _, reply_ident, _ = struct.unpack("!BBHHH", data[:8])
+    return icmp_type == ICMP_ECHO_REPLY and (not has_ip_header or reply_ident == ident)
+
+
+def icmp_probe(ip_address, timeout=1.0):
+    """
+    Sends one ICMP echo request and returns the round trip time in seconds, or None
+    if no reply arrived in time. Raises PermissionError if the process may not open
+    an ICMP socket (neither a raw socket nor an unprivileged ICMP datagram socket).
+    """
+    try:
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_ICMP)
+    except (PermissionError, OSError):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_RAW, socket.IPPROTO_ICMP)
+    with sock:
+        ident = os.getpid() & 0xFFFF
+        payload = b"hdmi-matrix-ctrl"
+        header = struct.pack("!BBHHH", ICMP_ECHO_REQUEST, 0, 0, ident, 1)
+        checksum = _checksum(header + payload)
+        message = struct.pack("!BBHHH", ICMP_ECHO_REQUEST, 0, checksum, ident, 1) + payload
+        start = time.monotonic()
+        deadline = start + timeout
+        sock.sendto(message, (ip_address, 0))
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return None
+            sock.settimeout(remaining)
+            try:
+                data, (source, _) = sock.recvfrom(1024)
+            except socket.timeout:
+                return None
+            if source == ip_address and _is_echo_reply(data, ident):
+                return time.monotonic() - start
+
+
+def tcp_probe(ip_address, port, timeout=1.0):
+    """
+    Attempts a TCP connection to the host and returns the round trip time in seconds,
+    or None if the host did not answer. A refused connection still proves the host is up.
+    """
+    start = time.monotonic()
+    try:
+        with socket.create_connection((ip_address, port), timeout=timeout):
+            pass
+    except ConnectionRefusedError:
+        pass
+    except OSError:
+        return None
+    return time.monotonic() - start
+
+
+def probe(ip_address, port, timeout=1.0, use_icmp=True):
+    """Returns the round trip time to the matrix in seconds, or None if it is unreachable."""
+    rtt = None
+    use_tcp = not use_icmp
+    if use_icmp:
+        try:
+            rtt = icmp_probe(ip_address, timeout)
+        except OSError:
+            use_tcp = True  # No ICMP privileges; fall back to TCP.
+    if use_tcp:
+        rtt = tcp_probe(ip_address, port, timeout)
+    PROBES.inc(result="failed" if rtt is None else "ok")
+    if rtt is not None:
+        PROBE_RTT.observe(rtt)
+    CONNECTED.set(0 if rtt is None else 1)
+    return rtt
+
+
+class HealthMonitor:
+    """
+    Probes the matrix on a fixed interval from a background thread and keeps a
+    history of the results. `on_change(is_connected)` is only called when the
+    connection status actually changes.
+
+    The last result doubles as a connection-state cache: `status()` is a cheap read
+    that only asks for a new probe once the cached result is older than `ttl`.
+    """
+
+    def __init__(self, controller, interval=10.0, timeout=1.0, history=100, on_change=None, ttl=None):
+        self.controller = controller
+        self.interval = interval
+        self.timeout = timeout
+        self.ttl = ttl if ttl is not None else interval
+        self.on_change = on_change
+        self.history = collections.deque(maxlen=history)
+        self.is_connected = None
+        self.last_checked = None
+        self._waiters = []
+        self._generation = 0
+        self._wake = threading.Event()
+        self._stopped = False
+        self._thread = threading.Thread(target=self._run, name="health-monitor", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def check_now(self, callback=None):
+        """
+        Runs a probe immediately instead of waiting for the next interval.
+        `callback(is_connected)` is called with its result, whether or not the status changed.
+        """
+        if callback:
+            self._waiters.append(callback)
+        self._wake.set()
+
+    def status(self):
+        """Returns the cached connection status (None if unknown), re-probing in the background once it expires."""
+        if self.last_checked is None or time.monotonic() - self.last_checked > self.ttl:
+            self.check_now()
+        return self.is_connected
+
+    def reset(self):
+        """Forgets the history, e.g. after the matrix endpoint changed, and re-probes."""
+        self._generation += 1
+        self.history.clear()
+        self.is_connected = None
+        self.last_checked = None
+        self.check_now()
+
+    def stop(self):
+        self._stopped = True
+        self._wake.set()
+
+    def stats(self):
+        """Returns min/avg/p95 round trip times in milliseconds and the loss percentage."""
+        samples = list(self.history)
+        rtts = sorted(rtt for rtt in samples if rtt is not None)
+        stats = {
+            "samples": len(samples),
+            "loss_pct": 100.0 * (len(samples) - len(rtts)) / len(samples) if samples else 0.0,
+            "min_ms": None,
+            "avg_ms": None,
+            "p95_ms": None,
+        }
+        if rtts:
+            stats["min_ms"] = rtts[0] * 1000
+            stats["avg_ms"] = sum(rtts) / len(rtts) * 1000
+            stats["p95_ms"] = rtts[min(len(rtts) - 1, int(0.95 * len(rtts)))] * 1000
+        return stats
+
+    def _run(self):
+        while not self._stopped:
+            generation = self._generation
+            rtt = probe(self.controller.ip_address, self.controller.port, self.timeout)
+            if generation != self._generation:
+                continue  # The endpoint changed while probing; the wake flag is still set.
+            self.history.append(rtt)
+            self.last_checked = time.monotonic()
+            is_connected = rtt is not None
+            waiters, self._waiters = self._waiters, []
+            if is_connected != self.is_connected:
+                self.is_connected = is_connected
+                if self.on_change:
+                    self.on_change(is_connected)
+            for callback in waiters:
+                callback(is_connected)
+            self._wake.wait(self.interval)
+            self._wake.clear()
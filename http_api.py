@@ -0,0 +1,300 @@
+"""
+An embedded HTTP/JSON control API for automation clients (show control, room booking).
+
+    GET  /state        {"routing": {"<out>": <in>, ...}}
+    GET  /health       {"connected": true|false|null, "stats": {...}}
+    GET  /metrics      Prometheus text format (see `metrics`)
+    POST /route        {"input": 3, "outputs": [1, 2]}   (or "output": 1)
+    POST /all          {"input": 3}
+    POST /one-to-one
+    POST /recall       {"preset": 4}
+    POST /store        {"preset": 4}
+
+The server is a single asyncio event loop, so connections cost no threads. Every
+command goes through one writer task that runs matrix I/O on a single worker
+thread, in arrival order. Commands that arrive in the same loop tick are
+coalesced first: consecutive routes are merged into one `route_many` (the last
+route to an output wins) and repeated identical commands are sent once.
+
+Run it headless with `python -m hdmi_matrix serve`, or next to the GUI by setting
+"api_port" in the settings.
+"""
+import asyncio
+import json
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+import metrics
+
+MAX_BODY_SIZE = 64 * 1024
+
+STATUS_TEXT = {
+    200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+    500: "Internal Server Error", 502: "Bad Gateway",
+}
+
+
+class ApiError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class ApiServer:
+    """
+    Serves the control API for one MatrixController.
+
+    `on_routing_changed(changes)` is called on the writer thread with the outputs
+    (output -> input) each command changed, and `on_preset(action, preset_num)` after
+    each "recall" or "store". By default they are applied to `config_manager` directly;
+    the GUI passes functions that apply them on the GUI thread instead, in order, since
+    it owns the routing state (a store must snapshot the routes queued before it).
+    """
+
+    def __init__(self, controller, config_manager, host="127.0.0.1", port=8080,
+                 health_monitor=None, on_routing_changed=None, on_preset=None):
+        self.controller = controller
+        self.config_manager = config_manager
+        self.host = host
+        self.port = port
+        self.health_monitor = health_monitor
+        self.on_routing_changed = on_routing_changed or self.apply_routing
+        self.on_preset = on_preset or self.apply_preset
+        self.requests_handled = 0
+        self.commands_executed = 0
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="api-writer")
+        self._queue = None
+        self._loop = None
+        self._server = None
+        self._thread = None
+        self._started = threading.Event()
+
+    @property
+    def address(self):
+        """The (host, port) the server is listening on; useful when started with port 0."""
+        return self._server.sockets[0].getsockname()[:2]
+
+    async def serve(self):
+        """Runs the server in the current event loop until it is cancelled."""
+        self._loop = asyncio.get_running_loop()
+        self._queue = asyncio.Queue()
+        self._server = await asyncio.start_server(self._handle_connection, self.host, self.port)
+        writer = asyncio.ensure_future(self._writer())
+        self._started.set()
+        try:
+            async with self._server:
+                await self._server.serve_forever()
+        finally:
+            writer.cancel()
+            self._executor.shutdown(wait=True)
+
+    def start(self):
+        """Runs the server on a background thread (for use next to the GUI)."""
+        self._thread = threading.Thread(target=self._run_thread, name="http-api", daemon=True)
+        self._thread.start()
+        self._started.wait(5)
+
+    def stop(self, timeout=None):
+        if self._loop is not None and self._server is not None:
+            self._loop.call_soon_threadsafe(self._server.close)
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _run_thread(self):
+        try:
+            asyncio.run(self.serve())
+        except asyncio.CancelledError:
+            pass
+        except OSError as e:
+            print(f"HTTP API failed to start on {self.host}:{self.port}: {e}")
+            self._started.set()
+
+    def apply_routing(self, changes):
+        if not changes:
+            return
+        settings = self.config_manager.settings
+        self.config_manager.output_mappings.update(changes)
+        self.config_manager.save_settings(
+            settings["ip"], settings["port"], settings["confirm_before_switch"], self.config_manager.output_mappings
+        )
+
+    def apply_preset(self, action, preset_num):
+        """Loads a recalled preset's snapshot (if known), or snapshots the routing into a stored one."""
+        if action == "recall":
+            self.apply_routing(self.config_manager.get_preset_snapshot(preset_num) or {})
+        else:
+            self.config_manager.set_preset_snapshot(preset_num, self.config_manager.output_mappings)
+
+    # HTTP
+
+    async def _handle_connection(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                try:
+                    method, path, _ = request_line.decode("latin-1").split(" ", 2)
+                except ValueError:
+                    await self._respond(writer, 400, {"error": "Malformed request line"}, close=True)
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                length = int(headers.get("content-length") or 0)
+                if length > MAX_BODY_SIZE:
+                    await self._respond(writer, 400, {"error": "Request body too large"}, close=True)
+                    break
+                body = await reader.readexactly(length) if length else b""
+                close = headers.get("connection", "").lower() == "close"
+                try:
+                    status, payload = 200, await self._dispatch(method, path.split("?", 1)[0], body)
+                except ApiError as e:
+                    status, payload = e.status, {"error": str(e)}
+                except OSError as e:
+                    status, payload = 502, {"error": f"Matrix unreachable: {e}"}
+                except Exception as e:
+                    traceback.print_exc()
+                    status, payload = 500, {"error": str(e)}
+                self.requests_handled += 1
+                await self._respond(writer, status, payload, close=close)
+                if close:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    @staticmethod
+    async def _respond(writer, status, payload, close=False):
+        if isinstance(payload, str):
+            body, content_type = payload.encode("utf-8"), "text/plain; version=0.0.4; charset=utf-8"
+        else:
+            body, content_type = json.dumps(payload).encode("utf-8"), "application/json"
+        head = (
+            f"HTTP/1.1 {status} {STATUS_TEXT[status]}\r\n"
+            f"Content-Type: {content_type}\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: {'close' if close else 'keep-alive'}\r\n\r\n"
+        )
+        writer.write(head.encode("latin-1") + body)
+        await writer.drain()
+
+    async def _dispatch(self, method, path, body):
+        if path == "/state":
+            if method != "GET":
+                raise ApiError(405, "Use GET")
+            return {"routing": self.config_manager.output_mappings.to_json()}
+        if path == "/health":
+            if method != "GET":
+                raise ApiError(405, "Use GET")
+            if self.health_monitor is None:
+                return {"connected": None, "stats": {}}
+            return {"connected": self.health_monitor.status(), "stats": self.health_monitor.stats()}
+        if path == "/metrics":
+            if method != "GET":
+                raise ApiError(405, "Use GET")
+            return metrics.REGISTRY.prometheus_text()
+        if path not in ("/route", "/all", "/one-to-one", "/recall", "/store"):
+            raise ApiError(404, f"Unknown path: {path}")
+        if method != "POST":
+            raise ApiError(405, "Use POST")
+        try:
+            request = json.loads(body) if body else {}
+        except ValueError:
+            raise ApiError(400, "Body is not valid JSON")
+        if not isinstance(request, dict):
+            raise ApiError(400, "Body must be a JSON object")
+        command = self._parse_command(path, request)
+        future = self._loop.create_future()
+        self._queue.put_nowait((command, future))
+        return {"result": await future}
+
+    def _parse_command(self, path, request):
+        if path == "/route":
+            outputs = request.get("outputs", [request["output"]] if "output" in request else None)
+            if not isinstance(outputs, list) or not outputs:
+                raise ApiError(400, "Give 'output' or a non-empty 'outputs' list")
+            input_num = self._number(request, "input", self.controller.num_inputs)
+            for output_num in outputs:
+                self._check_range("output", output_num, self.controller.num_outputs)
+            return ("route", {output_num: input_num for output_num in outputs})
+        if path == "/all":
+            return ("all", self._number(request, "input", self.controller.num_inputs))
+        if path == "/one-to-one":
+            return ("one_to_one", None)
+        preset_num = self._number(request, "preset", self.config_manager.settings["num_presets"])
+        return ("recall" if path == "/recall" else "store", preset_num)
+
+    def _number(self, request, key, maximum):
+        if key not in request:
+            raise ApiError(400, f"Missing '{key}'")
+        self._check_range(key, request[key], maximum)
+        return request[key]
+
+    @staticmethod
+    def _check_range(key, value, maximum):
+        if not isinstance(value, int) or isinstance(value, bool) or not 1 <= value <= maximum:
+            raise ApiError(400, f"'{key}' must be a number from 1 to {maximum}")
+
+    # The single writer
+
+    async def _writer(self):
+        while True:
+            batch = [await self._queue.get()]
+            # Everything that arrived in the same loop tick is coalesced into one batch.
+            await asyncio.sleep(0)
+            while not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+            for kind, payload, futures in self._coalesce(batch):
+                try:
+                    result = await self._loop.run_in_executor(self._executor, self._execute, kind, payload)
+                except Exception as e:
+                    for future in futures:
+                        if not future.done():
+                            future.set_exception(e)
+                    continue
+                for future in futures:
+                    if not future.done():
+                        future.set_result(result)
+
+    @staticmethod
+    def _coalesce(batch):
+        """Merges consecutive routes and drops consecutive duplicates, keeping the order."""
+        operations = []
+        for (kind, payload), future in batch:
+            if operations and operations[-1][0] == kind == "route":
+                operations[-1][1].update(payload)
+                operations[-1][2].append(future)
+            elif operations and operations[-1][0] == kind and operations[-1][1] == payload:
+                operations[-1][2].append(future)
+            else:
+                operations.append((kind, dict(payload) if kind == "route" else payload, [future]))
+        return operations
+
+    def _execute(self, kind, payload):
+        """Runs one coalesced command on the writer thread and reports its routing changes."""
+        controller = self.controller
+        self.commands_executed += 1
+        if kind == "route":
+            result = controller.route_many(payload)
+            changes = payload
+        elif kind == "all":
+            controller.route_all(payload)
+            result = f"Patching Input {payload} to all outputs"
+            changes = {output_num: payload for output_num in range(1, controller.num_outputs + 1)}
+        elif kind == "one_to_one":
+            controller.route_1_to_1()
+            result = "1/1 mapping"
+            changes = {n: n for n in range(1, min(controller.num_inputs, controller.num_outputs) + 1)}
+        else:
+            result = controller.recall_preset(payload) if kind == "recall" else controller.store_preset(payload)
+            self.on_preset(kind, payload)
+            return result
+        self.on_routing_changed(changes)
+        return result
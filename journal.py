@@ -0,0 +1,163 @@
+"""
+An append-only journal of every command sent to the matrix, used to recover the
+last routing after a crash and to answer "what was output N routed to at time T?".
+
+The journal directory holds:
+
+    snapshot.json            The routing as of the last compaction
+    journal.jsonl            One line per command since then
+    journal-<time>.jsonl     Older segments, kept for history queries
+
+Each journal line is `{"t": <unix time>, "cmd": "<command text>", "delta": {"<out>": <in>}}`.
+A line with `"reset": true` means the routing became unknown (e.g. a preset recall).
+Every segment after the first starts with a reset line carrying the full compacted
+routing, so history queries still work once the oldest segments are deleted.
+"""
+import json
+import threading
+import time
+from pathlib import Path
+
+from config_manager import write_json_atomic
+
+SNAPSHOT_NAME = "snapshot.json"
+JOURNAL_NAME = "journal.jsonl"
+# The command text of the reset line that starts each compacted segment.
+COMPACTION_COMMAND = "Snapshot"
+
+
+class RoutingJournal:
+    def __init__(self, directory, compact_every=500, keep_segments=20):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.compact_every = compact_every
+        self.keep_segments = keep_segments
+        self.snapshot_path = self.directory / SNAPSHOT_NAME
+        self.journal_path = self.directory / JOURNAL_NAME
+        # The routing the journal describes (output -> input), kept current by `record`.
+        self.state = {}
+        self.entries = 0
+        self._lock = threading.Lock()
+        self._file = None
+
+    def replay(self):
+        """Rebuilds the last journaled routing from the snapshot plus the journal, and returns it."""
+        with self._lock:
+            state = {}
+            if self.snapshot_path.exists():
+                try:
+                    with open(self.snapshot_path, "r", encoding="utf-8") as f:
+                        state = {int(k): v for k, v in json.load(f)["state"].items()}
+                except (json.JSONDecodeError, KeyError):
+                    state = {}
+            entries = 0
+            for entry in self._read_segment(self.journal_path):
+                state = self._apply(state, entry)
+                entries += 1
+            self.state = state
+            self.entries = entries
+        if entries >= self.compact_every:
+            self.compact()
+        return dict(self.state)
+
+    def changes_since(self, when):
+        """
+        Returns the routing changes (output -> input) journaled after unix time `when`,
+        i.e. the commands sent since the routing was last saved elsewhere. A reset drops
+        the changes before it, since the routing they describe is no longer known.
+        """
+        changes = {}
+        segments = [path for path in self._segments() if float(path.stem.split("-", 1)[1]) > when]
+        for path in segments + [self.journal_path]:
+            for entry in self._read_segment(path):
+                # Compaction restates the routing; it is not a command sent after `when`.
+                if entry["t"] <= when or entry["cmd"] == COMPACTION_COMMAND:
+                    continue
+                changes = self._apply(changes, entry)
+        return changes
+
+    def record(self, command, delta, reset=False, timestamp=None):
+        """Appends one command and the routing change it caused."""
+        entry = {"t": timestamp if timestamp is not None else time.time(), "cmd": command}
+        if reset:
+            entry["reset"] = True
+        entry["delta"] = {str(k): v for k, v in (delta or {}).items()}
+        line = json.dumps(entry, separators=(",", ":")) + "\n"
+        with self._lock:
+            if self._file is None:
+                self._file = open(self.journal_path, "a", buffering=1, encoding="utf-8")
+            self._file.write(line)
+            self.state = self._apply(self.state, entry)
+            self.entries += 1
+            needs_compaction = self.entries >= self.compact_every
+        if needs_compaction:
+            self.compact()
+
+    def compact(self):
+        """
+        Writes the current routing as a new snapshot and starts a fresh journal, so
+        replay only ever reads a bounded number of lines. The old journal is kept as
+        a history segment; the oldest segments beyond `keep_segments` are deleted.
+        """
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+            now = time.time()
+            if self.journal_path.exists():
+                self.journal_path.rename(self.directory / f"journal-{now:.6f}.jsonl")
+            state = {str(k): v for k, v in self.state.items()}
+            write_json_atomic(self.snapshot_path, {"t": now, "state": state})
+            # The new segment starts from the compacted routing, so it stands on its own.
+            self._file = open(self.journal_path, "a", buffering=1, encoding="utf-8")
+            self._file.write(json.dumps({"t": now, "cmd": COMPACTION_COMMAND, "reset": True, "delta": state},
+                                        separators=(",", ":")) + "\n")
+            self.entries = 1
+            for old_segment in self._segments()[:-self.keep_segments or None]:
+                old_segment.unlink()
+
+    def state_at(self, output_num, when):
+        """
+        Returns the input routed to `output_num` at unix time `when`, or None if it
+        was unknown. Segments are streamed line by line, never loaded whole.
+        """
+        input_num = None
+        for path in self._segments() + [self.journal_path]:
+            for entry in self._read_segment(path):
+                if entry["t"] > when:
+                    return input_num
+                if entry.get("reset"):
+                    input_num = None
+                input_num = entry["delta"].get(str(output_num), input_num)
+        return input_num
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def _segments(self):
+        return sorted(self.directory.glob("journal-*.jsonl"), key=lambda p: float(p.stem.split("-", 1)[1]))
+
+    @staticmethod
+    def _read_segment(path):
+        try:
+            f = open(path, "r", encoding="utf-8")
+        except FileNotFoundError:
+            return
+        with f:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    # A crash can leave a torn last line behind; everything before it is intact.
+                    continue
+
+    @staticmethod
+    def _apply(state, entry):
+        if entry.get("reset"):
+            state = {}
+        for output_num, input_num in entry["delta"].items():
+            state[int(output_num)] = input_num
+        return state
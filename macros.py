@@ -0,0 +1,314 @@
+"""
+Timed macros: sequences of matrix operations with waits between them, for show cues.
+
+Macros are defined in the "macros" setting as a list of
+
+    {"name": "Cue 1", "steps": [
+        {"op": "route", "input": 3, "outputs": [1, 2, 3, 4]},
+        {"wait": 0.25},
+        {"op": "recall", "preset": 6},
+        {"wait": 1.0},
+        {"op": "one_to_one"}
+    ]}
+
+Supported ops are "route" (`outputs` may be a single number), "all" (`input`),
+"one_to_one", "recall" (`preset`) and "store" (`preset`). Waits are in seconds.
+
+Each operation is scheduled at a fixed offset from the start of the run on the
+monotonic clock, so a slow step does not push the following ones back, and the
+timer thread never depends on the GUI event loop.
+"""
+import collections
+import heapq
+import itertools
+import threading
+import time
+import traceback
+
+OPS = ("route", "all", "one_to_one", "recall", "store")
+
+# Timer waits end this long before a deadline and the rest is spun, since waking
+# from a sleep can overshoot by a scheduler tick.
+SPIN_MARGIN = 0.002
+
+StepTiming = collections.namedtuple("StepTiming", "index op scheduled_ms late_ms duration_ms")
+
+
+def compile_macro(macro):
+    """
+    Turns a macro definition into a list of (offset seconds, step) pairs, one per
+    operation. Raises ValueError for unknown operations or malformed steps.
+    """
+    timeline = []
+    offset = 0.0
+    for step in macro["steps"]:
+        if "wait" in step:
+            wait = float(step["wait"])
+            if wait < 0:
+                raise ValueError(f"Negative wait in macro {macro['name']!r}")
+            offset += wait
+            continue
+        op = step.get("op")
+        if op not in OPS:
+            raise ValueError(f"Unknown macro operation {op!r} in macro {macro['name']!r}")
+        if op in ("route", "all") and "input" not in step:
+            raise ValueError(f"Step {op!r} in macro {macro['name']!r} needs an input")
+        if op == "route" and "outputs" not in step:
+            raise ValueError(f"Step 'route' in macro {macro['name']!r} needs outputs")
+        if op in ("recall", "store") and "preset" not in step:
+            raise ValueError(f"Step {op!r} in macro {macro['name']!r} needs a preset")
+        timeline.append((offset, step))
+    return timeline
+
+
+def check_step(step, num_inputs, num_outputs, num_presets):
+    """
+    Checks an operation from an untrusted source (e.g. another console): its shape, as
+    `compile_macro` does, and that every input, output and preset is an int in range.
+    Raises ValueError otherwise.
+    """
+    if not isinstance(step, dict) or "op" not in step or "wait" in step:
+        raise ValueError("A command must be an object with an 'op' and no 'wait'")
+    compile_macro({"name": "command", "steps": [step]})
+    checks = []
+    if step["op"] in ("route", "all"):
+        checks.append(("input", step["input"], num_inputs))
+    if step["op"] == "route":
+        outputs = step["outputs"]
+        if not isinstance(outputs, (int, list)) or outputs == []:
+            raise ValueError("'outputs' must be a number or a non-empty list")
+        checks += [("output", output_num, num_outputs) for output_num in step_outputs(step)]
+    if step["op"] in ("recall", "store"):
+        checks.append(("preset", step["preset"], num_presets))
+    for key, value, maximum in checks:
+        if not isinstance(value, int) or isinstance(value, bool) or not 1 <= value <= maximum:
+            raise ValueError(f"'{key}' must be a number from 1 to {maximum}, got {value!r}")
+
+
+def step_outputs(step):
+    outputs = step["outputs"]
+    return [outputs] if isinstance(outputs, int) else list(outputs)
+
+
+def step_routing(step, num_inputs, num_outputs, preset_snapshot=None):
+    """
+    Returns the routing changes (output -> input) a step makes. A recall only changes
+    what `preset_snapshot` says the preset holds; a store changes nothing.
+    """
+    op = step["op"]
+    if op == "route":
+        return {output_num: step["input"] for output_num in step_outputs(step)}
+    if op == "all":
+        return {output_num: step["input"] for output_num in range(1, num_outputs + 1)}
+    if op == "one_to_one":
+        return {n: n for n in range(1, min(num_inputs, num_outputs) + 1)}
+    if op == "recall":
+        return dict(preset_snapshot or {})
+    return {}
+
+
+def run_step(controller, step):
+    """Performs one macro operation on a MatrixController and returns its result text."""
+    op = step["op"]
+    if op == "route":
+        return controller.route_many({output_num: step["input"] for output_num in step_outputs(step)})
+    if op == "all":
+        controller.route_all(step["input"])
+        return f"Patching Input {step['input']} to all outputs"
+    if op == "one_to_one":
+        controller.route_1_to_1()
+        return "1/1 mapping"
+    if op == "recall":
+        return controller.recall_preset(step["preset"])
+    return controller.store_preset(step["preset"])
+
+
+class MacroRun:
+    """One execution of a macro. Created by `MacroScheduler.run`."""
+
+    def __init__(self, scheduler, name, timeline):
+        self.scheduler = scheduler
+        self.name = name
+        self.timeline = timeline
+        self.state = "running"  # running, paused, cancelled, done or failed
+        self.timings = []
+        self.start = None
+        self.next_index = 0
+        self.paused_at = None
+        # Bumped on pause/cancel so timers already queued for this run are ignored.
+        self.generation = 0
+        self.finished = threading.Event()
+
+    def cancel(self):
+        self.scheduler.cancel(self)
+
+    def pause(self):
+        self.scheduler.pause(self)
+
+    def resume(self):
+        self.scheduler.resume(self)
+
+    def wait(self, timeout=None):
+        """Blocks until the run has finished, failed or been cancelled."""
+        return self.finished.wait(timeout)
+
+    def max_late_ms(self):
+        """Returns the worst step start lateness seen so far, in milliseconds."""
+        return max((timing.late_ms for timing in self.timings), default=0.0)
+
+    def summary(self):
+        return (
+            f"Macro {self.name!r} {self.state}: {len(self.timings)}/{len(self.timeline)} steps, "
+            f"max lateness {self.max_late_ms():.2f} ms"
+        )
+
+
+class MacroScheduler:
+    """
+    Runs macro steps from a single timer thread ordered by monotonic deadline.
+
+    `on_step(run, index, step, result)` is called after every step and
+    `on_finish(run)` once a run ends; both are called on the timer thread, so the
+    GUI wraps them with its invoker. Steps call the controller directly rather than
+    going through the command dispatcher, so queued GUI commands cannot delay a cue.
+    """
+
+    def __init__(self, controller, on_step=None, on_finish=None, on_error=None):
+        self.controller = controller
+        self.on_step = on_step
+        self.on_finish = on_finish
+        self.on_error = on_error
+        self._timers = []
+        self._sequence = itertools.count()
+        self._runs = set()
+        self._condition = threading.Condition()
+        self._stopped = False
+        self._thread = threading.Thread(target=self._run, name="macro-scheduler", daemon=True)
+        self._thread.start()
+
+    def run(self, macro):
+        """Starts a macro definition (see the module docstring) and returns its MacroRun."""
+        run = MacroRun(self, macro["name"], compile_macro(macro))
+        with self._condition:
+            run.start = time.monotonic()
+            self._runs.add(run)
+            scheduled = self._schedule(run)
+        if not scheduled:
+            self._finish(run)
+        return run
+
+    def runs(self):
+        """Returns the runs that have not finished yet."""
+        with self._condition:
+            return list(self._runs)
+
+    def pause(self, run):
+        with self._condition:
+            if run.state != "running":
+                return
+            run.state = "paused"
+            run.paused_at = time.monotonic()
+            run.generation += 1
+
+    def resume(self, run):
+        with self._condition:
+            if run.state != "paused":
+                return
+            # Shift the rest of the timeline by however long the run was paused.
+            run.start += time.monotonic() - run.paused_at
+            run.paused_at = None
+            run.state = "running"
+            scheduled = self._schedule(run)
+        if not scheduled:
+            self._finish(run)
+
+    def cancel(self, run):
+        with self._condition:
+            if run.state not in ("running", "paused"):
+                return
+            run.state = "cancelled"
+            run.generation += 1
+        self._finish(run)
+
+    def cancel_all(self):
+        for run in self.runs():
+            self.cancel(run)
+
+    def stop(self, timeout=None):
+        """Cancels every run and stops the timer thread."""
+        self.cancel_all()
+        with self._condition:
+            self._stopped = True
+            self._condition.notify()
+        self._thread.join(timeout)
+
+    def _schedule(self, run):
+        """
+        Queues the run's next step. Returns False (and marks the run done) if there
+        is none; the caller then finishes it outside the lock. Called with the lock held.
+        """
+        if run.next_index >= len(run.timeline):
+            run.state = "done"
+            return False
+        offset, _ = run.timeline[run.next_index]
+        heapq.heappush(self._timers, (run.start + offset, next(self._sequence), run, run.generation))
+        self._condition.notify()
+        return True
+
+    def _finish(self, run):
+        with self._condition:
+            self._runs.discard(run)
+        run.finished.set()
+        if self.on_finish:
+            self.on_finish(run)
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while True:
+                    if self._stopped:
+                        return
+                    if not self._timers:
+                        self._condition.wait()
+                        continue
+                    deadline, _, run, generation = self._timers[0]
+                    if generation != run.generation:
+                        heapq.heappop(self._timers)
+                        continue
+                    remaining = deadline - time.monotonic()
+                    if remaining > SPIN_MARGIN:
+                        self._condition.wait(remaining - SPIN_MARGIN)
+                        continue
+                    heapq.heappop(self._timers)
+                    break
+            while time.monotonic() < deadline:
+                time.sleep(0)  # Yields the GIL while spinning.
+            self._fire(run, deadline)
+
+    def _fire(self, run, deadline):
+        index = run.next_index
+        offset, step = run.timeline[index]
+        started = time.monotonic()
+        try:
+            result = run_step(self.controller, step)
+        except Exception as e:
+            with self._condition:
+                run.state = "failed"
+                run.generation += 1
+            if self.on_error:
+                self.on_error(e)
+            else:
+                traceback.print_exc()
+            self._finish(run)
+            return
+        finished = time.monotonic()
+        run.timings.append(StepTiming(
+            index, step["op"], offset * 1000, (started - deadline) * 1000, (finished - started) * 1000
+        ))
+        if self.on_step:
+            self.on_step(run, index, step, result)
+        with self._condition:
+            run.next_index = index + 1
+            scheduled = run.state != "running" or self._schedule(run)
+        if not scheduled:
+            self._finish(run)
@@ -11,14 +11,26 @@ from PyQt5.QtWidgets import(
     QTabWidget,
     QMenuBar,
     QFileDialog,
+    QInputDialog,
 )
 from matrix_controller import MatrixController
 from ui.io_tab import IoTab
 from ui.preset_tab import PresetTab
 from ui.settings_tab import SettingsTab
 from ui.dialogs import RenameDialog
-from utils import ConnectivityChecker
-from config import CONFIG_FILE, NAMES_FILE
+from change_feed import ChangeFeedPublisher, ChangeFeedSubscriber, RemoteController
+from dispatcher import CommandDispatcher
+import discovery
+from fleet import FleetController
+from health import HealthMonitor
+from http_api import ApiServer
+from journal import RoutingJournal
+import metrics
+import tracing
+from macros import MacroScheduler, check_step, run_step, step_routing
+from readback import StatePoller, diff_routing
+from utils import GuiInvoker
+from config import CONFIG_FILE, JOURNAL_DIR, NAMES_FILE
 from config_manager import ConfigManager
 
 class HdmiMatrixApp(QWidget):
@@ -29,44 +41,223 @@ class HdmiMatrixApp(QWidget):
         self.names = self.config_manager.names
         self.output_mappings = self.config_manager.output_mappings
 
-        self.controller = MatrixController(
-            ip_address=self.settings["ip"], port=self.settings["port"]
+        # Consoles sharing one matrix: the "owner" holds the controller and publishes every
+        # change, a "subscriber" mirrors it and sends its commands to the owner.
+        self.feed_role = self.settings["feed_role"]
+        self.feed_publisher = None
+        self.feed_subscriber = None
+        if self.feed_role == "subscriber":
+            self.feed_subscriber = ChangeFeedSubscriber(
+                self.settings["feed_host"],
+                self.settings["feed_port"],
+                on_message=lambda message: self.gui_invoker.call(self.on_feed_message, message),
+                on_disconnect=lambda: self.gui_invoker.call(self.on_connectivity_checked, False),
+            )
+            self.controller = RemoteController(
+                self.feed_subscriber,
+                num_inputs=self.settings["num_inputs"],
+                num_outputs=self.settings["num_outputs"],
+            )
+        else:
+            self.controller = MatrixController(
+                ip_address=self.settings["ip"],
+                port=self.settings["port"],
+                max_datagram_size=self.settings["max_datagram_size"],
+                num_inputs=self.settings["num_inputs"],
+                num_outputs=self.settings["num_outputs"],
+                min_packet_gap=self.config_manager.get_packet_gap(self.settings["ip"], self.settings["port"]),
+            )
+        # Every command is journaled as it goes out, so after a crash the journal can be
+        # newer than the (debounced) config write; recover the commands sent after that write.
+        # Older entries are already in the saved routing, or were overridden by local changes.
+        self.journal = RoutingJournal(JOURNAL_DIR)
+        self.journal.replay()
+        # Entries from before commands were range-checked may be garbage; skip those.
+        recovered = {
+            output_num: input_num
+            for output_num, input_num in self.journal.changes_since(self.settings.get("saved_at", 0)).items()
+            if 1 <= output_num <= self.settings["num_outputs"]
+            and isinstance(input_num, int) and 1 <= input_num <= self.settings["num_inputs"]
+        }
+        self.controller.journal = self.journal
+        recovered = diff_routing(self.output_mappings, recovered)
+        if recovered:
+            self.output_mappings.update(recovered)
+            self.save_routing()
+            print(f"Recovered {len(recovered)} output(s) from the routing journal")
+        # All network I/O runs off the GUI thread; results come back through the invoker.
+        self.gui_invoker = GuiInvoker(self)
+        self.dispatcher = CommandDispatcher(
+            deliver=self.gui_invoker.call, on_error=self.on_command_failed
+        )
+        self.health_monitor = HealthMonitor(
+            self.controller,
+            interval=self.settings["health_check_interval"],
+            on_change=lambda is_connected: self.gui_invoker.call(self.on_connectivity_checked, is_connected),
+        )
+        # Polls the matrix for its real routing so front-panel/IR changes show up here. Off unless
+        # "readback_interval" is set, since the status reply format is not verified on every model.
+        self.state_poller = StatePoller(
+            self.controller,
+            self.output_mappings,
+            interval=self.settings["readback_interval"],
+            on_change=lambda changes: self.gui_invoker.call(self.on_device_state_changed, changes),
+        )
+        # Show cues run on their own timer thread so a busy UI cannot delay them.
+        self.macro_scheduler = MacroScheduler(
+            self.controller,
+            on_step=lambda run, index, step, result: self.gui_invoker.call(self.on_macro_step, run, step, result),
+            on_finish=lambda run: self.gui_invoker.call(self.on_macro_finished, run),
+            on_error=lambda e: self.gui_invoker.call(self.on_command_failed, e),
         )
+        # Optional HTTP control API for automation clients; its routing changes are applied here.
+        self.api_server = None
+        if self.settings["api_port"]:
+            self.api_server = ApiServer(
+                self.controller,
+                self.config_manager,
+                host=self.settings["api_host"],
+                port=self.settings["api_port"],
+                health_monitor=self.health_monitor,
+                on_routing_changed=lambda changes: self.gui_invoker.call(self.on_api_routing_changed, changes),
+                on_preset=lambda action, preset_num: self.gui_invoker.call(self.on_api_preset, action, preset_num),
+            )
+        if self.feed_role == "owner":
+            self.feed_publisher = ChangeFeedPublisher(
+                self.output_mappings,
+                host=self.settings["feed_host"],
+                port=self.settings["feed_port"],
+                on_command=lambda step: self.gui_invoker.call(self.on_feed_command, step),
+                matrix={"ip": self.settings["ip"], "port": self.settings["port"]},
+            )
+        if self.settings["tracing"]:
+            tracing.enable()
+        self.fleet = self.build_fleet()
         self.setWindowTitle("HDMI Matrix Control - by prodYakkai >:3")
         self.selected_input = None
         self.init_ui()
         self.set_theme(self.settings["theme"])
         self.update_button_names()
-        self.check_connectivity()
+        self.io_tab.set_connection_status("Status: Checking...", "", False)
+        if self.feed_subscriber is not None:
+            # The owner probes and polls the matrix and reports the results through the feed.
+            self.feed_subscriber.start()
+        else:
+            self.health_monitor.start()
+            if self.settings["readback_interval"] > 0:
+                self.state_poller.start()
+        if self.feed_publisher is not None:
+            self.feed_publisher.start()
+        if self.api_server is not None:
+            self.api_server.start()
+        self.metrics_server = None
+        if self.settings["metrics_port"]:
+            try:
+                self.metrics_server = metrics.serve_metrics(self.settings["api_host"], self.settings["metrics_port"])
+            except OSError as e:
+                print(f"Metrics endpoint failed to start on port {self.settings['metrics_port']}: {e}")
 
     def set_theme(self, theme_name):
         stylesheet = self.config_manager.get_theme_stylesheet(theme_name)
         self.setStyleSheet(stylesheet)
-        self.settings["theme"] = theme_name
-        self.config_manager.save_settings(
-            self.settings["ip"],
-            self.settings["port"],
-            self.settings["confirm_before_switch"],
-            self.output_mappings,
-            theme=theme_name
+        self.config_manager.set_theme(theme_name)
+
+    def build_fleet(self):
+        # A subscriber sends everything through the owner; driving the matrices directly would
+        # bypass it and leave the consoles out of step, so it has no fleet.
+        if self.feed_role == "subscriber":
+            return None
+        return FleetController.from_endpoints(
+            self.config_manager.get_matrices(),
+            max_datagram_size=self.settings["max_datagram_size"],
+            num_inputs=self.settings["num_inputs"],
+            num_outputs=self.settings["num_outputs"],
+            min_packet_gap=self.settings["min_packet_gap_ms"] / 1000,
+            primary=self.controller,
         )
 
     def save_settings(self):
         ip = self.settings_tab.get_ip_address()
         port = self.settings_tab.get_port()
         confirm_before_switch = self.settings_tab.get_confirm_before_switch_state()
+        endpoint_changed = (ip, port) != (self.settings["ip"], self.settings["port"])
         self.config_manager.save_settings(ip, port, confirm_before_switch, self.output_mappings)
+        feed_settings = self.settings_tab.get_feed_settings()
+        if feed_settings != (self.settings["feed_role"], self.settings["feed_host"], self.settings["feed_port"]):
+            self.config_manager.set_feed_settings(*feed_settings)
+            QMessageBox.information(self, "Console Role", "The console role change takes effect after a restart.")
         self.settings = self.config_manager.settings # Update local settings reference
 
-        self.controller.ip_address = self.settings["ip"]
-        self.controller.port = self.settings["port"]
+        if endpoint_changed:
+            self.dispatcher.submit(
+                self.controller.set_endpoint, self.settings["ip"], self.settings["port"],
+                self.config_manager.get_packet_gap(self.settings["ip"], self.settings["port"]),
+            )
+            # The fleet may share the primary controller, so rebuild it against the new endpoint.
+            old_fleet = self.fleet
+            self.fleet = None
+            if old_fleet is not None:
+                self.dispatcher.submit(old_fleet.close)
+            self.dispatcher.submit(self.build_fleet, callback=self.on_fleet_rebuilt)
+            # Only a new endpoint invalidates the cached connection state.
+            self.dispatcher.submit(self.health_monitor.reset)
+            self.io_tab.set_connection_status("Status: Checking...", "", False)
         self.io_tab.set_ip_address_label(self.settings["ip"])
         print(f"Settings saved: {self.settings['ip']}:{self.settings['port']}")
-        self.check_connectivity()
+
+    def save_routing(self):
+        """Persists the current output mappings without touching any other setting."""
+        self.config_manager.save_settings(
+            self.settings["ip"],
+            self.settings["port"],
+            self.settings["confirm_before_switch"],
+            self.output_mappings,
+        )
 
     def save_names(self):
         self.config_manager.save_names()
 
+    def on_fleet_rebuilt(self, fleet):
+        self.fleet = fleet
+
+    def discover_matrices(self):
+        """Scans the subnet on the Settings tab for matrices, off the GUI thread."""
+        try:
+            port = self.settings_tab.get_port()
+        except ValueError:
+            port = self.settings["port"]
+        self.settings_tab.set_discovering(True)
+        discovery.discover_in_background(
+            self.settings_tab.get_network(), port,
+            callback=lambda scan: self.gui_invoker.call(self.on_discovery_finished, scan),
+        )
+
+    def on_discovery_finished(self, scan):
+        self.settings_tab.set_discovering(False)
+        if isinstance(scan, Exception):
+            QMessageBox.warning(self, "Discovery Error", f"Cannot scan for matrices: {scan}")
+            return
+        self.settings_tab.show_discovered(scan)
+
+    def closeEvent(self, event):
+        if self.fleet is not None:
+            self.dispatcher.submit(self.fleet.close)
+        self.dispatcher.submit(self.controller.close)
+        if self.api_server is not None:
+            self.api_server.stop(timeout=2)
+        if self.feed_publisher is not None:
+            self.feed_publisher.stop(timeout=2)
+        if self.metrics_server is not None:
+            self.metrics_server.shutdown()
+        self.macro_scheduler.stop(timeout=2)
+        self.dispatcher.stop(timeout=2)
+        self.health_monitor.stop()
+        self.state_poller.stop()
+        self.journal.close()
+        self.config_manager.flush()
+        super().closeEvent(event)
+
+    @tracing.traced()
     def update_button_names(self):
         preset = self.names.get("current_preset", "1")
         input_names = self.names.get("presets", {}).get(preset, {}).get("inputs", {})
@@ -91,6 +282,46 @@ class HdmiMatrixApp(QWidget):
         load_action = file_menu.addAction("Load I/O Map")
         load_action.triggered.connect(self.load_io_map_from_file)
 
+        file_menu.addSeparator()
+
+        trace_action = file_menu.addAction("Record Latency Trace")
+        trace_action.setCheckable(True)
+        trace_action.setChecked(tracing.is_enabled())
+        trace_action.toggled.connect(self.set_tracing)
+
+        dump_trace_action = file_menu.addAction("Dump Trace...")
+        dump_trace_action.triggered.connect(self.dump_trace)
+
+        # Only the console that drives the matrix may control the fleet (see `build_fleet`).
+        if self.fleet is not None:
+            fleet_menu = menu_bar.addMenu("Fleet")
+
+            fleet_recall_action = fleet_menu.addAction("Recall Preset on All Matrices...")
+            fleet_recall_action.triggered.connect(self.fleet_recall_preset)
+
+            fleet_one_to_one_action = fleet_menu.addAction("1/1 Map All Matrices")
+            fleet_one_to_one_action.triggered.connect(self.fleet_map_one_to_one)
+
+            fleet_sync_action = fleet_menu.addAction("Sync All Matrices")
+            fleet_sync_action.triggered.connect(self.fleet_sync)
+
+        macro_menu = menu_bar.addMenu("Macros")
+        for macro in self.config_manager.get_macros():
+            macro_action = macro_menu.addAction(f"Run {macro['name']}")
+            macro_action.triggered.connect(lambda _, m=macro: self.run_macro(m))
+        if not self.config_manager.get_macros():
+            macro_menu.addAction("No macros defined in config.json").setEnabled(False)
+        macro_menu.addSeparator()
+
+        pause_macros_action = macro_menu.addAction("Pause Macros")
+        pause_macros_action.triggered.connect(self.pause_macros)
+
+        resume_macros_action = macro_menu.addAction("Resume Macros")
+        resume_macros_action.triggered.connect(self.resume_macros)
+
+        cancel_macros_action = macro_menu.addAction("Cancel Macros")
+        cancel_macros_action.triggered.connect(self.macro_scheduler.cancel_all)
+
         tabs = QTabWidget()
         main_layout.addWidget(tabs)
 
@@ -106,46 +337,70 @@ class HdmiMatrixApp(QWidget):
 
     def check_connectivity(self):
         self.io_tab.set_connection_status("Status: Checking...", "", False)
-        self.connectivity_checker = ConnectivityChecker(self.controller)
-        self.connectivity_checker.finished.connect(self.on_connectivity_checked)
-        self.connectivity_checker.start()
+        self.health_monitor.check_now(
+            callback=lambda is_connected: self.gui_invoker.call(self.on_connectivity_checked, is_connected, True)
+        )
 
-    def on_connectivity_checked(self, is_connected):
+    def on_device_state_changed(self, changes):
+        if self.dispatcher.pending():
+            return  # Our own commands are still queued; the next poll will see them applied.
+        # Re-check on the GUI thread, since the routing may have changed since the poll.
+        changes = diff_routing(self.output_mappings, changes)
+        if not changes:
+            return
+        for output_num, input_num in changes.items():
+            self.output_mappings[output_num] = input_num
+        self.io_tab.refresh_outputs(changes)
+        self.save_routing()
+        self.io_tab.set_last_command_text(f"Matrix reported {len(changes)} changed output(s)")
+
+    def on_command_sent(self, command):
+        # Reading the cached connection state is free; it never triggers a probe per click.
+        if self.health_monitor.status() is False:
+            command += " (matrix unreachable)"
+        self.io_tab.set_last_command_text(command)
+
+    def on_command_failed(self, error):
+        self.io_tab.set_last_command_text(f"Failed: {error}")
+
+    def on_connectivity_checked(self, is_connected, user_initiated=False):
+        if self.feed_publisher is not None:
+            self.feed_publisher.publish_connection(is_connected)
         if is_connected:
-            self.io_tab.set_connection_status("Status: Connected", "color: green", False)
+            self.io_tab.set_connection_status("Status: Connected", "connected", False)
         else:
-            self.io_tab.set_connection_status("Status: Disconnected", "color: red", True)
-            QMessageBox.warning(
-                self, "Connection Failed", "Could not connect to the matrix."
-            )
+            self.io_tab.set_connection_status("Status: Disconnected", "disconnected", True)
+            # Background status changes only update the label; a modal dialog in the
+            # middle of a show is reserved for an explicit Retry.
+            if user_initiated:
+                QMessageBox.warning(
+                    self, "Connection Failed", "Could not connect to the matrix."
+                )
 
     def on_input_selected(self, input_num):
         self.selected_input = input_num
-        # Clear previous input highlight
-        for i, button in enumerate(self.io_tab.input_buttons):
-            if i + 1 == input_num:
-                button.setStyleSheet("background-color: #a3be8c")  # Green for selected input
-            else:
-                button.setStyleSheet("")
-        
-        # Update output button styles based on the newly selected input
-        self._update_output_button_styles()
+        # Highlights the input and the outputs it feeds; only buttons that change are touched.
+        self.io_tab.set_selected_input(input_num)
 
     def _update_output_button_styles(self, clicked_output_num=None):
         self.io_tab.update_output_button_styles(self.output_mappings, self.selected_input, clicked_output_num)
 
+    @tracing.traced()
     def on_output_selected(self, output_num):
         if self.selected_input is None:
             print("Please select an input first.")
             return
 
         def perform_route():
-            command = self.controller.route(self.selected_input, output_num)
-            self.io_tab.set_last_command_text(command)
-            self.output_mappings[output_num] = self.selected_input
-            self.update_button_names()
-            self._update_output_button_styles(clicked_output_num=output_num)
-            self.save_settings()
+            with tracing.span("perform_route", input=self.selected_input, output=output_num):
+                self.dispatcher.submit(
+                    self.controller.route, self.selected_input, output_num,
+                    callback=self.on_command_sent,
+                )
+                self.output_mappings[output_num] = self.selected_input
+                with tracing.span("repaint_output"):
+                    self.io_tab.set_clicked_output(output_num)
+                self.save_routing()
 
         if self.settings["confirm_before_switch"]:
             if (
@@ -153,24 +408,26 @@ class HdmiMatrixApp(QWidget):
                 and self.output_mappings[output_num] != self.selected_input
             ):
                 current_input = self.output_mappings[output_num]
-                reply = QMessageBox.question(
-                    self,
-                    "Confirm Override",
-                    f"Output {output_num} is already connected to Input {current_input}. "
-                    f"Do you want to switch it to Input {self.selected_input}?",
-                    QMessageBox.Yes | QMessageBox.No,
-                    QMessageBox.No,
-                )
+                with tracing.span("confirm_dialog"):
+                    reply = QMessageBox.question(
+                        self,
+                        "Confirm Override",
+                        f"Output {output_num} is already connected to Input {current_input}. "
+                        f"Do you want to switch it to Input {self.selected_input}?",
+                        QMessageBox.Yes | QMessageBox.No,
+                        QMessageBox.No,
+                    )
                 if reply == QMessageBox.Yes:
                     perform_route()
             else:
-                reply = QMessageBox.question(
-                    self,
-                    "Confirm Switch",
-                    f"Are you sure you want to route Input {self.selected_input} to Output {output_num}?",
-                    QMessageBox.Yes | QMessageBox.No,
-                    QMessageBox.No,
-                )
+                with tracing.span("confirm_dialog"):
+                    reply = QMessageBox.question(
+                        self,
+                        "Confirm Switch",
+                        f"Are you sure you want to route Input {self.selected_input} to Output {output_num}?",
+                        QMessageBox.Yes | QMessageBox.No,
+                        QMessageBox.No,
+                    )
                 if reply == QMessageBox.Yes:
                     perform_route()
         else: # No confirmation needed
@@ -180,7 +437,7 @@ class HdmiMatrixApp(QWidget):
         context_menu = QMenu(self)
         patch_all_action = context_menu.addAction("Patch to all outputs")
         rename_action = context_menu.addAction("Rename")
-        action = context_menu.exec_(self.io_tab.input_buttons[input_num - 1].mapToGlobal(pos))
+        action = context_menu.exec_(pos)
         if action == patch_all_action:
             self.patch_all_outputs(input_num)
         elif action == rename_action:
@@ -190,7 +447,7 @@ class HdmiMatrixApp(QWidget):
         context_menu = QMenu(self)
         rename_action = context_menu.addAction("Rename")
         trace_action = context_menu.addAction("Trace")
-        action = context_menu.exec_(self.io_tab.output_buttons[output_num - 1].mapToGlobal(pos))
+        action = context_menu.exec_(pos)
         if action == rename_action:
             self.rename_output(output_num)
         elif action == trace_action:
@@ -220,97 +477,364 @@ class HdmiMatrixApp(QWidget):
             self.save_names()
             self.update_button_names()
 
+    @tracing.traced()
     def patch_all_outputs(self, input_num):
         if self.settings["confirm_before_switch"]:
-            reply = QMessageBox.question(
-                self,
-                "Confirm Patch All",
-                f"Are you sure you want to patch Input {input_num} to all outputs?",
-                QMessageBox.Yes | QMessageBox.No,
-                QMessageBox.No,
-            )
+            with tracing.span("confirm_dialog"):
+                reply = QMessageBox.question(
+                    self,
+                    "Confirm Patch All",
+                    f"Are you sure you want to patch Input {input_num} to all outputs?",
+                    QMessageBox.Yes | QMessageBox.No,
+                    QMessageBox.No,
+                )
             if reply == QMessageBox.No:
                 return
 
         self.on_input_selected(input_num)
         command = f"Patching Input {input_num} to all outputs"
-        self.controller.route_all(input_num)
-        for i in range(16):
-            output_num = i + 1
+        self.dispatcher.submit(
+            self.controller.route_all, input_num,
+            callback=lambda _: self.io_tab.set_last_command_text(command),
+        )
+        for output_num in range(1, self.settings["num_outputs"] + 1):
             self.output_mappings[output_num] = input_num
-        self.io_tab.set_last_command_text(command)
-        self.update_button_names()
+        self._update_output_button_styles()
 
+    @tracing.traced()
     def map_one_to_one(self):
         if self.settings["confirm_before_switch"]:
-            reply = QMessageBox.question(
-                self,
-                "Confirm 1/1 Mapping",
-                "Are you sure you want to map all inputs to their corresponding outputs?",
-                QMessageBox.Yes | QMessageBox.No,
-                QMessageBox.No,
-            )
+            with tracing.span("confirm_dialog"):
+                reply = QMessageBox.question(
+                    self,
+                    "Confirm 1/1 Mapping",
+                    "Are you sure you want to map all inputs to their corresponding outputs?",
+                    QMessageBox.Yes | QMessageBox.No,
+                    QMessageBox.No,
+                )
             if reply == QMessageBox.No:
                 return
 
         command = "1/1 mapping"
-        self.controller.route_1_to_1()
-        for i in range(16):
-            input_num = i + 1
-            output_num = i + 1
-            self.output_mappings[output_num] = input_num
-        self.io_tab.set_last_command_text(command)
-        self.update_button_names()
+        self.dispatcher.submit(
+            self.controller.route_1_to_1,
+            callback=lambda _: self.io_tab.set_last_command_text(command),
+        )
+        for output_num in range(1, min(self.settings["num_inputs"], self.settings["num_outputs"]) + 1):
+            self.output_mappings[output_num] = output_num
+        self._update_output_button_styles()
 
+    @tracing.traced()
     def on_preset_selected(self, preset_num):
-        if self.preset_tab.is_recall_selected():
+        if self.preset_tab.is_recall_selected() or self.preset_tab.is_recall_diff_selected():
             if self.settings["confirm_before_switch"]:
-                reply = QMessageBox.question(
-                    self,
-                    "Confirm Recall",
-                    f"Are you sure you want to recall Preset {preset_num}? This will override the current routing.",
-                    QMessageBox.Yes | QMessageBox.No,
-                    QMessageBox.No,
-                )
+                with tracing.span("confirm_dialog"):
+                    reply = QMessageBox.question(
+                        self,
+                        "Confirm Recall",
+                        f"Are you sure you want to recall Preset {preset_num}? This will override the current routing.",
+                        QMessageBox.Yes | QMessageBox.No,
+                        QMessageBox.No,
+                    )
                 if reply == QMessageBox.No:
                     return
-            command = self.controller.recall_preset(preset_num)
-            self.io_tab.set_last_command_text(command)
+            snapshot = self.config_manager.get_preset_snapshot(preset_num)
+            if self.preset_tab.is_recall_diff_selected() and snapshot is not None:
+                # Only the crosspoints that differ from the current routing go on the wire.
+                self.dispatcher.submit(
+                    self.controller.sync, snapshot, dict(self.output_mappings),
+                    callback=lambda result: self.on_command_sent(f"Preset {preset_num}: {result}"),
+                )
+            else:
+                if self.preset_tab.is_recall_diff_selected():
+                    print(f"Preset {preset_num} has no saved snapshot; recalling it on the device")
+                self.dispatcher.submit(
+                    self.controller.recall_preset, preset_num,
+                    callback=self.on_command_sent,
+                )
+            if snapshot is not None:
+                # We know what the preset contains, so the local routing stays correct.
+                self.output_mappings.update(snapshot)
+                self.save_routing()
             self.names["current_preset"] = str(preset_num)
             self.save_names()
             self.update_button_names()
+            if self.feed_publisher is not None:
+                self.feed_publisher.publish_preset(preset_num, "recall")
         elif self.preset_tab.is_store_selected():
             if self.settings["confirm_before_switch"]:
+                with tracing.span("confirm_dialog"):
+                    reply = QMessageBox.question(
+                        self,
+                        "Confirm Store",
+                        f"Are you sure you want to store the current routing to Preset {preset_num}?",
+                        QMessageBox.Yes | QMessageBox.No,
+                        QMessageBox.No,
+                    )
+                if reply == QMessageBox.No:
+                    return
+            self.dispatcher.submit(
+                self.controller.store_preset, preset_num,
+                callback=self.on_command_sent,
+            )
+            self.config_manager.set_preset_snapshot(preset_num, self.output_mappings)
+            self.preset_tab.show_preview(preset_num)
+            if self.feed_publisher is not None:
+                self.feed_publisher.publish_preset(preset_num, "store")
+
+    def describe_preset(self, preset_num):
+        """Returns a text preview of a preset's saved routing, marking outputs that would change."""
+        snapshot = self.config_manager.get_preset_snapshot(preset_num)
+        if snapshot is None:
+            return f"Preset {preset_num}: contents unknown (store it from this app to preview it)."
+        names = self.names.get("presets", {}).get(str(preset_num), {})
+        input_names = names.get("inputs", {})
+        output_names = names.get("outputs", {})
+        changes = diff_routing(self.output_mappings, snapshot)
+        lines = [f"Preset {preset_num}: {len(changes)} output(s) differ from the current routing (*)"]
+        for output_num, input_num in sorted(snapshot.items()):
+            marker = "*" if output_num in changes else " "
+            output_name = output_names.get(str(output_num), f"Output {output_num}")
+            input_name = input_names.get(str(input_num), f"Input {input_num}")
+            lines.append(f"{marker} {output_name} <-- {input_name}")
+        return "\n".join(lines)
+
+    @tracing.traced()
+    def sync_state_to_matrix(self, force=False):
+        """
+        Sends the current routing to the matrix. Normally only the outputs that differ
+        from the device state the controller remembers are sent; with `force` every
+        output is resent, to recover after lost datagrams or front-panel changes.
+        """
+        if self.settings["confirm_before_switch"]:
+            with tracing.span("confirm_dialog"):
                 reply = QMessageBox.question(
                     self,
-                    "Confirm Store",
-                    f"Are you sure you want to store the current routing to Preset {preset_num}?",
+                    "Confirm Sync",
+                    "Are you sure you want to sync the current software state to the matrix? "
+                    + ("This will resend every output." if force else "This will send any routing commands that differ."),
                     QMessageBox.Yes | QMessageBox.No,
                     QMessageBox.No,
                 )
-                if reply == QMessageBox.No:
-                    return
-            command = self.controller.store_preset(preset_num)
-            self.io_tab.set_last_command_text(command)
-
-    def sync_state_to_matrix(self):
-        if self.settings["confirm_before_switch"]:
-            reply = QMessageBox.question(
-                self,
-                "Confirm Sync",
-                "Are you sure you want to sync the current software state to the matrix? This will send all routing commands.",
-                QMessageBox.Yes | QMessageBox.No,
-                QMessageBox.No,
-            )
             if reply == QMessageBox.No:
                 return
 
         self.io_tab.set_last_command_text("Syncing state...")
-        for output_num, input_num in self.output_mappings.items():
-            command = self.controller.route(input_num, output_num)
-            self.io_tab.set_last_command_text(command)
+        self.dispatcher.submit(
+            self.controller.sync, dict(self.output_mappings), {} if force else None,
+            callback=self.on_sync_complete,
+        )
+
+    def on_sync_complete(self, command):
+        self.io_tab.set_last_command_text(command)
         QMessageBox.information(self, "Sync Complete", "Current state synced to matrix.")
 
+    def fleet_recall_preset(self):
+        preset_num, ok = QInputDialog.getInt(
+            self, "Recall Preset on All Matrices", "Preset:", 1, 1, self.settings["num_presets"]
+        )
+        if not ok or self.fleet is None:
+            return
+        self.io_tab.set_last_command_text(f"Recalling Preset {preset_num} on all matrices...")
+        self.dispatcher.submit(
+            self.fleet.recall_preset, preset_num,
+            callback=lambda results: self.on_fleet_results(
+                f"Recall Preset {preset_num}", results, {"op": "recall", "preset": preset_num}
+            ),
+        )
+
+    def fleet_map_one_to_one(self):
+        if self.fleet is None:
+            return
+        if self.settings["confirm_before_switch"]:
+            with tracing.span("confirm_dialog"):
+                reply = QMessageBox.question(
+                    self,
+                    "Confirm 1/1 Mapping",
+                    "Are you sure you want to map all inputs to their corresponding outputs on every matrix?",
+                    QMessageBox.Yes | QMessageBox.No,
+                    QMessageBox.No,
+                )
+            if reply == QMessageBox.No:
+                return
+        self.io_tab.set_last_command_text("1/1 mapping all matrices...")
+        self.dispatcher.submit(
+            self.fleet.route_1_to_1,
+            callback=lambda results: self.on_fleet_results("1/1 mapping", results, {"op": "one_to_one"}),
+        )
+
+    def fleet_sync(self):
+        if self.fleet is None:
+            return
+        if self.settings["confirm_before_switch"]:
+            with tracing.span("confirm_dialog"):
+                reply = QMessageBox.question(
+                    self,
+                    "Confirm Sync",
+                    "Are you sure you want to sync the current software state to every matrix?",
+                    QMessageBox.Yes | QMessageBox.No,
+                    QMessageBox.No,
+                )
+            if reply == QMessageBox.No:
+                return
+        self.io_tab.set_last_command_text("Syncing all matrices...")
+        self.dispatcher.submit(
+            self.fleet.sync, dict(self.output_mappings),
+            callback=lambda results: self.on_fleet_results("Sync", results),
+        )
+
+    def on_fleet_results(self, title, results, step=None):
+        """
+        Reports a fleet operation. `step` is the operation as a macro-style step; if it
+        succeeded on the app's own matrix, its routing is updated the same way a local
+        command would update it.
+        """
+        if step is not None and self.fleet is not None:
+            if any(r.ok and r.name == self.fleet.primary_name for r in results):
+                self._apply_step_routing(step)
+                if step["op"] == "recall":
+                    self.names["current_preset"] = str(step["preset"])
+                    self.save_names()
+                    self.update_button_names()
+        failed = [r for r in results if not r.ok]
+        lines = [
+            f"{r.name}: OK ({r.elapsed_ms:.0f} ms)" if r.ok else f"{r.name}: FAILED - {r.error}"
+            for r in results
+        ]
+        self.io_tab.set_last_command_text(
+            f"{title} on {len(results) - len(failed)}/{len(results)} matrices"
+        )
+        if failed:
+            QMessageBox.warning(self, f"{title} - Fleet", "\n".join(lines))
+        else:
+            QMessageBox.information(self, f"{title} - Fleet", "\n".join(lines))
+
+    def run_macro(self, macro):
+        try:
+            self.macro_scheduler.run(macro)
+        except (KeyError, ValueError) as e:
+            QMessageBox.warning(self, "Macro Error", f"Cannot run macro: {e}")
+            return
+        self.io_tab.set_last_command_text(f"Running macro {macro['name']}")
+
+    def pause_macros(self):
+        for run in self.macro_scheduler.runs():
+            run.pause()
+
+    def resume_macros(self):
+        for run in self.macro_scheduler.runs():
+            run.resume()
+
+    def on_macro_step(self, run, step, result):
+        self._apply_step_routing(step)
+        self.io_tab.set_last_command_text(f"{run.name}: {result}")
+
+    def _apply_step_routing(self, step):
+        """
+        Updates the local routing with the effect of a macro-style step (see `macros`),
+        and snapshots the routing into the preset for a store.
+        """
+        snapshot = self.config_manager.get_preset_snapshot(step["preset"]) if step["op"] == "recall" else None
+        changes = step_routing(step, self.settings["num_inputs"], self.settings["num_outputs"], snapshot)
+        if changes:
+            self.output_mappings.update(changes)
+            self.io_tab.refresh_outputs(changes)
+            self.save_routing()
+        if step["op"] == "store":
+            self.config_manager.set_preset_snapshot(step["preset"], self.output_mappings)
+
+    def on_feed_command(self, step):
+        """Runs a command sent by a subscriber console (owner role)."""
+        try:
+            check_step(step, self.settings["num_inputs"], self.settings["num_outputs"], self.settings["num_presets"])
+        except ValueError as e:
+            print(f"Ignoring invalid console command {step!r}: {e}")
+            return
+        self.dispatcher.submit(run_step, self.controller, step, callback=self.on_command_sent)
+        self._apply_step_routing(step)
+        if step["op"] == "recall":
+            self.names["current_preset"] = str(step["preset"])
+            self.save_names()
+            self.update_button_names()
+        if step["op"] in ("recall", "store"):
+            self.feed_publisher.publish_preset(step["preset"], step["op"])
+
+    def on_feed_message(self, message):
+        """Applies a message from the owner console's change feed (subscriber role)."""
+        kind = message.get("type")
+        if kind == "snapshot":
+            self.output_mappings.replace({int(k): v for k, v in message["routing"].items()})
+            if message.get("matrix"):
+                self.controller.ip_address = message["matrix"]["ip"]
+                self.controller.port = message["matrix"]["port"]
+                self.io_tab.set_ip_address_label(self.controller.ip_address)
+            if message.get("preset") is not None:
+                self.names["current_preset"] = str(message["preset"])
+            self.update_button_names()
+            if message.get("connected") is not None:
+                self.on_connectivity_checked(message["connected"])
+        elif kind == "routing":
+            changes = {int(k): v for k, v in message["changes"].items()}
+            for output_num, input_num in changes.items():
+                if input_num is None:
+                    self.output_mappings.pop(output_num, None)
+                else:
+                    self.output_mappings[output_num] = input_num
+            self.io_tab.refresh_outputs(changes)
+        elif kind == "preset" and message["action"] == "recall":
+            self.names["current_preset"] = str(message["preset"])
+            self.update_button_names()
+        elif kind == "connection":
+            self.on_connectivity_checked(message["connected"])
+
+    def on_api_routing_changed(self, changes):
+        if not changes:
+            return
+        self.output_mappings.update(changes)
+        self.io_tab.refresh_outputs(changes)
+        self.save_routing()
+        self.io_tab.set_last_command_text(f"HTTP API changed {len(changes)} output(s)")
+
+    def on_api_preset(self, action, preset_num):
+        # Queued behind the API's earlier routing changes, so a store snapshots them too.
+        self._apply_step_routing({"op": action, "preset": preset_num})
+        if action == "recall":
+            self.names["current_preset"] = str(preset_num)
+            self.save_names()
+            self.update_button_names()
+        self.io_tab.set_last_command_text(f"HTTP API {action} Preset {preset_num}")
+
+    def on_macro_finished(self, run):
+        print(run.summary())
+        for timing in run.timings:
+            print(f"  step {timing.index} {timing.op}: at {timing.scheduled_ms:.0f} ms, "
+                  f"late {timing.late_ms:.2f} ms, took {timing.duration_ms:.1f} ms")
+        self.io_tab.set_last_command_text(run.summary())
+
+    def set_tracing(self, enabled):
+        if enabled:
+            tracing.enable()
+        else:
+            tracing.disable()
+        self.settings["tracing"] = enabled
+        self.config_manager.mark_dirty("settings")
+
+    def dump_trace(self):
+        if not tracing.is_enabled():
+            QMessageBox.information(self, "Dump Trace", "Enable File > Record Latency Trace first, then repeat the slow action.")
+            return
+        file_path, _ = QFileDialog.getSaveFileName(
+            self, "Dump Trace", "hdmi-matrix-trace.json", "Chrome Trace Files (*.json);;All Files (*)"
+        )
+        if not file_path:
+            return
+        try:
+            count = tracing.dump_chrome_trace(file_path)
+        except OSError as e:
+            QMessageBox.critical(self, "Dump Trace", f"Failed to write trace: {e}")
+            return
+        self.io_tab.set_last_command_text(f"Wrote {count} spans to {file_path} (open in chrome://tracing)")
+
     def trace_output_to_input(self, output_num):
         if output_num in self.output_mappings:
             input_num = self.output_mappings[output_num]
@@ -328,7 +852,7 @@ class HdmiMatrixApp(QWidget):
                 output_names_for_preset = self.names["presets"].get(current_preset, {}).get("outputs", {})
 
                 data_to_save = {
-                    "mappings": self.output_mappings,
+                    "mappings": self.output_mappings.to_json(),
                     "output_names": output_names_for_preset
                 }
 
@@ -337,13 +861,14 @@ class HdmiMatrixApp(QWidget):
                 QMessageBox.information(self, "Save Complete", "I/O map and output names saved successfully.")
                 
                 if self.settings["confirm_before_switch"]:
-                    reply = QMessageBox.question(
-                        self,
-                        "Sync to Matrix",
-                        "Do you want to sync the saved I/O map to the matrix?",
-                        QMessageBox.Yes | QMessageBox.No,
-                        QMessageBox.No,
-                    )
+                    with tracing.span("confirm_dialog"):
+                        reply = QMessageBox.question(
+                            self,
+                            "Sync to Matrix",
+                            "Do you want to sync the saved I/O map to the matrix?",
+                            QMessageBox.Yes | QMessageBox.No,
+                            QMessageBox.No,
+                        )
                     if reply == QMessageBox.Yes:
                         self.sync_state_to_matrix()
 
@@ -366,7 +891,7 @@ class HdmiMatrixApp(QWidget):
                     raise ValueError("Invalid I/O map file format.")
 
                 # Load mappings
-                self.output_mappings = {int(k): v for k, v in loaded_data["mappings"].items()}
+                self.output_mappings.replace({int(k): v for k, v in loaded_data["mappings"].items()})
 
                 # Load output names for the current preset
                 current_preset = self.names["current_preset"]
@@ -380,6 +905,17 @@ class HdmiMatrixApp(QWidget):
                 self._update_output_button_styles()
                 QMessageBox.information(self, "Load Complete", "I/O map and output names loaded successfully.")
 
+                with tracing.span("confirm_dialog"):
+                    reply = QMessageBox.question(
+                        self,
+                        "Sync to Matrix",
+                        "Do you want to sync the loaded I/O map to the matrix?",
+                        QMessageBox.Yes | QMessageBox.No,
+                        QMessageBox.No,
+                    )
+                if reply == QMessageBox.Yes:
+                    self.sync_state_to_matrix()
+
             except Exception as e:
                 QMessageBox.critical(self, "Error", f"Failed to load I/O map: {e}")
 
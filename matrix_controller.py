@@ -1,78 +1,298 @@
 """
 This module will contain the core logic for controlling the HDMI matrix.
 """
+import selectors
 import socket
+import threading
 import time
-import subprocess
-import sys
-import requests
+import health
+import metrics
+import protocol
+import tracing
+from planner import apply_plan, pack_commands, plan_sync
+
+COMMANDS = metrics.counter("hdmi_matrix_commands_total", "Matrix commands sent, by command type", ("type",))
+PACKETS = metrics.counter("hdmi_matrix_packets_sent_total", "UDP datagrams sent to the matrix")
+SEND_ERRORS = metrics.counter("hdmi_matrix_send_errors_total", "Datagrams that could not be sent")
+SEND_LATENCY = metrics.histogram("hdmi_matrix_send_latency_seconds", "Time spent handing a datagram to the socket")
+PACING_DELAY = metrics.histogram("hdmi_matrix_pacing_delay_seconds", "Time a datagram waited for the minimum inter-packet gap")
+
+# The gap the original code always slept after each datagram; safe for the devices we know.
+DEFAULT_MIN_PACKET_GAP = 0.05
+
+
+class Pacer:
+    """
+    Keeps datagrams at least `min_gap` seconds apart, measured on the monotonic clock
+    from the previous send. A command after a quiet period goes out immediately; only
+    back-to-back datagrams wait, and only for the rest of the gap.
+    """
+
+    def __init__(self, min_gap=DEFAULT_MIN_PACKET_GAP):
+        self.min_gap = min_gap
+        self._next_send = 0.0
+
+    def wait(self):
+        """Sleeps until the next datagram may be sent and returns how long that took."""
+        delay = self._next_send - time.monotonic()
+        if delay <= 0:
+            return 0.0
+        time.sleep(delay)
+        return delay
+
+    def sent(self):
+        """Records that a datagram just went out."""
+        self._next_send = time.monotonic() + self.min_gap
+
+
+class UdpTransport:
+    """A long-lived UDP socket connected to a single matrix endpoint."""
+
+    def __init__(self, ip_address, port, timeout=1):
+        self.ip_address = ip_address
+        self.port = port
+        self.timeout = timeout
+        self.socket = None
+
+    def open(self):
+        """Creates the socket and connects it to the endpoint, if not already open."""
+        if self.socket is None:
+            sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            sock.settimeout(self.timeout)
+            try:
+                sock.connect((self.ip_address, self.port))
+            except OSError:
+                sock.close()
+                raise
+            self.socket = sock
+        return self.socket
+
+    def send(self, data: bytes):
+        """Sends a single datagram, reopening the socket once if it was lost."""
+        try:
+            return self.open().send(data)
+        except OSError:
+            # The socket can go stale (e.g. the interface went down); rebuild it and retry once.
+            self.close()
+            return self.open().send(data)
+
+    def close(self):
+        if self.socket is not None:
+            self.socket.close()
+            self.socket = None
+
+
 class MatrixController:
-    def __init__(self, ip_address, port):
+    def __init__(self, ip_address, port, max_datagram_size=64, num_inputs=16, num_outputs=16,
+                 min_packet_gap=DEFAULT_MIN_PACKET_GAP):
         self.ip_address = ip_address
         self.port = port
+        self.max_datagram_size = max_datagram_size
+        self.num_inputs = num_inputs
+        self.num_outputs = num_outputs
+        # Last-known routing of the device (output -> input), as far as the commands we sent tell us.
+        self.known_state = {}
+        self.transport = UdpTransport(ip_address, port)
+        # Spaces out bursts of datagrams so the device can keep up (see `Pacer`).
+        self.pacer = Pacer(min_packet_gap)
+        # Commands may come from the dispatcher and from background pollers; the lock keeps
+        # each multi-packet operation and its effect on `known_state` together.
+        self._lock = threading.RLock()
+        self.packets_sent = 0
+        # Optional `journal.RoutingJournal`; every command sent is recorded with its routing delta.
+        self.journal = None
+        protocol.precompile(num_inputs=num_inputs, num_outputs=num_outputs)
+
+    def set_endpoint(self, ip_address, port, min_packet_gap=None):
+        """Points the controller at a new matrix, rebuilding the transport only if it changed."""
+        if min_packet_gap is not None:
+            self.pacer.min_gap = min_packet_gap
+        if ip_address == self.ip_address and port == self.port:
+            return
+        with self._lock:
+            self.transport.close()
+            self.ip_address = ip_address
+            self.port = port
+            self.known_state = {}
+            self.transport = UdpTransport(ip_address, port)
+            self._record(f"Endpoint {ip_address}:{port}", None, reset=True)
 
-        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        self.socket.settimeout(1)  # Set a timeout for socket operations
+    def close(self):
+        """Releases the transport socket."""
+        self.transport.close()
 
     def route(self, input_port: int, output_port: int):
         """Constructs and sends a UDP packet to route an input to an output."""
         command = f"Routing Input {input_port} to Output {output_port}"
-        packet_cmd = f"{input_port}V{output_port}."
-        self.udp_send(packet_cmd, self.ip_address, self.port)
+        self.execute_plan([("route", input_port, output_port)])
         return command
 
+    def route_many(self, mapping):
+        """
+        Routes several outputs at once. `mapping` maps output ports to input ports; the
+        routing commands are packed into as few datagrams as `max_datagram_size` allows.
+        """
+        plan = [("route", input_port, output_port) for output_port, input_port in mapping.items()]
+        self.execute_plan(plan)
+        return f"Routing {len(plan)} outputs"
+
+    def sync(self, desired, current=None):
+        """
+        Brings the matrix to the `desired` routing (output -> input), sending only the
+        cheapest set of commands needed from the last-known device state, or from
+        `current` if the caller tracks the routing itself (e.g. the GUI's routing state).
+        """
+        if current is None:
+            current = self.known_state
+        plan = plan_sync(current, desired, self.num_outputs, self.max_datagram_size, self.num_inputs)
+        if not plan:
+            return "Matrix already in sync"
+        packets = self.execute_plan(plan)
+        return f"Synced {len(plan)} commands in {packets} packets"
+
+    def execute_plan(self, plan):
+        """
+        Sends a list of planner commands and records their effect. Returns the packet count.
+        Raises ValueError, before anything is sent or journaled, if a port is out of range.
+        """
+        for command in plan:
+            if command[0] in ("route", "all"):
+                self._check_port("Input", command[1], self.num_inputs)
+            if command[0] == "route":
+                self._check_port("Output", command[2], self.num_outputs)
+        packets = pack_commands(plan, self.max_datagram_size)
+        with self._lock:
+            for packet in packets:
+                self.send_packet(packet)
+            for command in plan:
+                COMMANDS.inc(type=command[0])
+            previous = self.known_state
+            self.known_state = apply_plan(previous, plan, self.num_outputs, self.num_inputs)
+            self._record(
+                b"".join([protocol.command_bytes(command) for command in plan]).decode("ascii"),
+                {o: i for o, i in self.known_state.items() if previous.get(o) != i},
+            )
+        return len(packets)
+
     def recall_preset(self, preset_num):
         """Recalls a preset from the matrix."""
+        self._check_port("Preset", preset_num)
         command = f"Recalling Preset {preset_num}"
-        packet_cmd = f"Recall{preset_num:02d}."
-        self.udp_send(packet_cmd, self.ip_address, self.port)
+        with self._lock:
+            self.send_packet(protocol.packet(("recall", preset_num)))
+            COMMANDS.inc(type="recall")
+            # We do not know what the preset contains, so the device routing is unknown again.
+            self.known_state = {}
+            self._record(protocol.command_bytes(("recall", preset_num)).decode("ascii"), None, reset=True)
         return command
 
     def store_preset(self, preset_num):
         """Stores the current routing to a preset in the matrix."""
+        self._check_port("Preset", preset_num)
         command = f"Storing Preset {preset_num}"
-        packet_cmd = f"Save{preset_num:02d}."
-        self.udp_send(packet_cmd, self.ip_address, self.port)
+        with self._lock:
+            self.send_packet(protocol.packet(("save", preset_num)))
+            COMMANDS.inc(type="save")
+            self._record(protocol.command_bytes(("save", preset_num)).decode("ascii"), None)
         return command
 
     def route_all(self, input_port: int):
         """Routes the selected input to all outputs."""
-        packet_cmd = f"{input_port}All"
-        self.udp_send(packet_cmd, self.ip_address, self.port)
-    
+        self.execute_plan([("all", input_port)])
+
     def route_1_to_1(self):
-        packet_cmd = "All#."
-        self.udp_send(packet_cmd, self.ip_address, self.port)
+        self.execute_plan([("one_to_one",)])
 
+    def udp_send(self, string_data: str):
+        """
+        Sends a UDP packet with the given string data to the matrix over the persistent transport.
+        """
+        with self._lock:
+            self.send_packet(protocol.encode(string_data))
+            COMMANDS.inc(type="raw")
+            self._record(string_data, None)
+
+    def send_packet(self, packet: bytes):
+        """Sends an already encoded datagram (see `protocol`)."""
+        with self._lock, tracing.span("send_packet", size=len(packet)):
+            PACING_DELAY.observe(self.pacer.wait())
+            start = time.perf_counter()
+            try:
+                self.transport.send(packet)
+            except OSError:
+                SEND_ERRORS.inc()
+                raise
+            finally:
+                self.pacer.sent()
+            SEND_LATENCY.observe(time.perf_counter() - start)
+            PACKETS.inc()
+            self.packets_sent += 1
 
-    def udp_send(self, string_data: str, ip_address: str, port: int = 20107):
+    def query_state(self, timeout=0.5, idle=0.05):
         """
-        Sends a UDP packet with the given string data to the specified IP address and port.
+        Asks the matrix for its routing and returns it as a dict of output -> input,
+        or None if no usable reply arrived (or commands were sent while we waited, so
+        the reply may already be stale). Replies are read without blocking through a
+        selector; reading stops once every output was reported, or `idle` seconds
+        after the last reply datagram.
         """
-        print(f"Sending command: {string_data} to {ip_address}:{port}")
-        bytes_data = string_data.encode('utf-16')
-        bytes2 = bytearray(len(bytes_data) // 2)
-
-        # Extract every second byte from the UTF-8 encoded data
-        for b in range(len(bytes2)):
-            bytes2[b] = bytes_data[b * 2]
-    
-        # Create a UDP socket and send the data
-        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        end_point = (ip_address, port)
-        self.socket.sendto(bytes2, end_point)
-        time.sleep(0.05) # Add 50ms delay
-        self.socket.close()
-
-    def check_connection(self):
-        """Checks if the matrix is reachable via ping."""
-       # check ping
-        try:
-            count_param = "-c" if sys.platform != "win32" else "-n"
-            output = subprocess.check_output(["ping", count_param, "1", self.ip_address], stderr=subprocess.STDOUT, universal_newlines=True)
-            if sys.platform == "win32":
-                return "TTL=" in output
-            else:
-                return "1 received" in output or "1 packets received" in output
-        except subprocess.CalledProcessError:
-            return False
+        with self._lock:
+            sock = self.transport.open()
+            # Drop anything left over from an earlier query that timed out.
+            sock.setblocking(False)
+            try:
+                while True:
+                    sock.recv(4096)
+            except (BlockingIOError, OSError):
+                pass
+            finally:
+                sock.settimeout(self.transport.timeout)
+            self.send_packet(protocol.packet(("status",)))
+            COMMANDS.inc(type="status")
+            sent_before = self.packets_sent
+
+        reply = b""
+        state = {}
+        deadline = time.monotonic() + timeout
+        with selectors.DefaultSelector() as selector:
+            try:
+                selector.register(sock, selectors.EVENT_READ)
+                while len(state) < self.num_outputs:
+                    wait = deadline - time.monotonic()
+                    if reply:
+                        wait = min(wait, idle)
+                    if wait <= 0 or not selector.select(wait):
+                        break
+                    reply += sock.recv(4096)
+                    state = protocol.parse_status(reply)
+            except (OSError, ValueError):
+                return None  # The socket was closed or the matrix refused the query.
+
+        with self._lock:
+            if not state or self.packets_sent != sent_before:
+                return None
+            previous = self.known_state
+            self.known_state = dict(state)
+            delta = {o: i for o, i in state.items() if previous.get(o) != i}
+            if delta:
+                self._record("Status.", delta)
+        return state
+
+    @staticmethod
+    def _check_port(name, number, maximum=None):
+        if not isinstance(number, int) or isinstance(number, bool) or number < 1 or (maximum and number > maximum):
+            limit = f"1 to {maximum}" if maximum else "a positive number"
+            raise ValueError(f"{name} {number!r} is out of range (expected {limit})")
+
+    def _record(self, command, delta, reset=False):
+        """Appends a sent command to the journal, if one is attached. Called with the lock held."""
+        if self.journal is not None:
+            try:
+                self.journal.record(command, delta, reset=reset)
+            except OSError as e:
+                # A full disk must not stop the matrix from being controlled.
+                print(f"Failed to write routing journal: {e}")
+
+    def check_connection(self, timeout=1.0):
+        """Checks if the matrix is reachable with an in-process probe."""
+        return health.probe(self.ip_address, self.port, timeout) is not None
@@ -0,0 +1,256 @@
+"""
+A small in-process metrics registry for the control path: counters, histograms and
+gauges, exported as Prometheus text or as a JSON-able snapshot.
+
+Modules create their metrics once at import time from the shared `REGISTRY`:
+
+    COMMANDS = metrics.counter("hdmi_matrix_commands_total", "Commands sent", ("type",))
+    COMMANDS.inc(type="route")
+
+Set the "metrics_port" setting to serve `/metrics` for Prometheus next to the GUI,
+or pass `--metrics` to the command line tool to print a JSON snapshot.
+"""
+import bisect
+import json
+import math
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_value(value):
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, help_text, label_names=()):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(label_names)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _snapshot_of(self, items):
+        """Label-less metrics snapshot to their value; labelled ones to {"label,values": value}."""
+        if not self.label_names:
+            return items.get((), None)
+        return {",".join(key): value for key, value in items.items()}
+
+    def _key(self, labels):
+        if set(labels) != set(self.label_names):
+            raise ValueError(f"{self.name} takes labels {self.label_names}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.label_names)
+
+
+class Counter(_Metric):
+    """A value that only goes up, e.g. commands sent."""
+
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(self._key(labels), 0)
+
+    def samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        return [(self.name, _format_labels(self.label_names, key), value) for key, value in items]
+
+    def snapshot(self):
+        with self._lock:
+            if not self.label_names:
+                return self._values.get((), 0)
+            return self._snapshot_of(dict(self._values))
+
+
+class Gauge(_Metric):
+    """A value that goes up and down, e.g. pending commands. May be computed on export."""
+
+    kind = "gauge"
+
+    def __init__(self, name, help_text, label_names=()):
+        super().__init__(name, help_text, label_names)
+        self._function = None
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def set_function(self, function):
+        """Reads the (label-less) value from `function()` whenever the metrics are exported."""
+        self._function = function
+
+    def value(self, **labels):
+        if self._function is not None:
+            return self._function()
+        return self._values.get(self._key(labels))
+
+    def _items(self):
+        if self._function is not None:
+            return [((), self._function())]
+        with self._lock:
+            return list(self._values.items())
+
+    def samples(self):
+        return [(self.name, _format_labels(self.label_names, key), value) for key, value in self._items()]
+
+    def snapshot(self):
+        return self._snapshot_of(dict(self._items()))
+
+
+class Histogram(_Metric):
+    """Counts observations (e.g. latencies in seconds) into cumulative buckets."""
+
+    kind = "histogram"
+
+    def __init__(self, name, help_text, label_names=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help_text, label_names)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._values.get(key)
+            if series is None:
+                series = self._values[key] = {"counts": [0] * (len(self.buckets) + 1), "sum": 0.0, "count": 0}
+            series["counts"][index] += 1
+            series["sum"] += value
+            series["count"] += 1
+
+    def _series(self):
+        with self._lock:
+            return [(key, list(s["counts"]), s["sum"], s["count"]) for key, s in self._values.items()]
+
+    def samples(self):
+        samples = []
+        for key, counts, total, count in self._series():
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (math.inf,), counts):
+                cumulative += bucket_count
+                labels = _format_labels(self.label_names, key, [("le", _format_value(bound))])
+                samples.append((f"{self.name}_bucket", labels, cumulative))
+            labels = _format_labels(self.label_names, key)
+            samples.append((f"{self.name}_sum", labels, total))
+            samples.append((f"{self.name}_count", labels, count))
+        return samples
+
+    def snapshot(self):
+        snapshot = {}
+        for key, counts, total, count in self._series():
+            snapshot[key] = {
+                "count": count,
+                "sum": total,
+                "avg": total / count if count else None,
+                "buckets": {_format_value(bound): n for bound, n in zip(self.buckets + (math.inf,), counts)},
+            }
+        return self._snapshot_of(snapshot)
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, cls, name, *args, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, *args, **kwargs)
+            elif not isinstance(metric, cls):
+                raise ValueError(f"Metric {name} is already registered as a {metric.kind}")
+            return metric
+
+    def counter(self, name, help_text, label_names=()):
+        return self._get_or_create(Counter, name, help_text, label_names)
+
+    def gauge(self, name, help_text, label_names=()):
+        return self._get_or_create(Gauge, name, help_text, label_names)
+
+    def histogram(self, name, help_text, label_names=(), buckets=DEFAULT_BUCKETS):
+        return self._get_or_create(Histogram, name, help_text, label_names, buckets=buckets)
+
+    def prometheus_text(self):
+        """Returns every metric in the Prometheus text exposition format."""
+        with self._lock:
+            metrics = sorted(self._metrics.values(), key=lambda m: m.name)
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, labels, value in metric.samples():
+                if value is not None:
+                    lines.append(f"{name}{labels} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self):
+        """Returns every metric as a JSON-able dict of name -> {labels: value}."""
+        with self._lock:
+            metrics = sorted(self._metrics.values(), key=lambda m: m.name)
+        return {metric.name: metric.snapshot() for metric in metrics}
+
+
+REGISTRY = MetricsRegistry()
+
+
+def counter(name, help_text, label_names=()):
+    return REGISTRY.counter(name, help_text, label_names)
+
+
+def gauge(name, help_text, label_names=()):
+    return REGISTRY.gauge(name, help_text, label_names)
+
+
+def histogram(name, help_text, label_names=(), buckets=DEFAULT_BUCKETS):
+    return REGISTRY.histogram(name, help_text, label_names, buckets)
+
+
+def snapshot_json(registry=REGISTRY):
+    return json.dumps(registry.snapshot(), indent=4)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    registry = REGISTRY
+
+    def do_GET(self):
+        if self.path.split("?", 1)[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = self.registry.prometheus_text().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # Scrapes every few seconds would flood the console.
+
+
+def serve_metrics(host="127.0.0.1", port=9108):
+    """Serves /metrics in Prometheus text format from a daemon thread. Returns the server."""
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    return server
@@ -0,0 +1,102 @@
+"""
+Plans the cheapest sequence of matrix commands that moves the device from its
+last-known routing to a desired routing.
+
+Commands are the plain tuples understood by `protocol`, so plans can be built,
+compared and costed without a network connection.
+"""
+
+from protocol import PACKET_PREFIX, command_bytes, join_packet
+
+DEFAULT_MAX_DATAGRAM_SIZE = 64
+
+
+def is_bulk(command):
+    """Bulk commands are always sent in a datagram of their own ("{n}All" has no terminator)."""
+    return command[0] in ("all", "one_to_one")
+
+
+def pack_commands(commands, max_datagram_size=DEFAULT_MAX_DATAGRAM_SIZE):
+    """
+    Greedily packs planner commands into encoded datagrams, preserving their order.
+    Routing commands share datagrams up to `max_datagram_size` bytes; bulk commands
+    get a datagram each.
+    """
+    packets = []
+    current = []
+    size = len(PACKET_PREFIX)
+    for command in commands:
+        if is_bulk(command):
+            if current:
+                packets.append(join_packet(current))
+                current, size = [], len(PACKET_PREFIX)
+            packets.append(join_packet([command]))
+            continue
+        length = len(command_bytes(command))
+        if current and size + length > max_datagram_size:
+            packets.append(join_packet(current))
+            current, size = [], len(PACKET_PREFIX)
+        current.append(command)
+        size += length
+    if current:
+        packets.append(join_packet(current))
+    return packets
+
+
+def plan_cost(commands, max_datagram_size=DEFAULT_MAX_DATAGRAM_SIZE):
+    """Returns the (packets, bytes) a plan costs on the wire. Plans compare by packets first."""
+    packets = pack_commands(commands, max_datagram_size)
+    return len(packets), sum(len(p) for p in packets)
+
+
+def apply_plan(state, commands, num_outputs, num_inputs=None):
+    """
+    Returns the routing that results from running `commands` against `state`.
+    "All#." only maps the outputs that have a matching input (`num_inputs` defaults
+    to `num_outputs`); any others are left unknown, as after a preset recall.
+    """
+    if num_inputs is None:
+        num_inputs = num_outputs
+    result = dict(state)
+    for command in commands:
+        kind = command[0]
+        if kind == "route":
+            result[command[2]] = command[1]
+        elif kind == "all":
+            result = {output_num: command[1] for output_num in range(1, num_outputs + 1)}
+        elif kind == "one_to_one":
+            result = {output_num: output_num for output_num in range(1, min(num_inputs, num_outputs) + 1)}
+    return result
+
+
+def _corrections(base, desired):
+    return [
+        ("route", input_num, output_num)
+        for output_num, input_num in sorted(desired.items())
+        if base.get(output_num) != input_num
+    ]
+
+
+def plan_sync(current, desired, num_outputs=16, max_datagram_size=DEFAULT_MAX_DATAGRAM_SIZE, num_inputs=None):
+    """
+    Plans the commands that take the matrix from `current` to `desired`.
+
+    Both arguments map output ports to input ports; outputs missing from `current`
+    are treated as unknown and always resent. The baseline plan only routes the
+    outputs that differ. When `desired` covers every output, bulk alternatives
+    ("All#." or "{n}All" followed by corrections) are also considered, and the
+    cheapest plan by `plan_cost` wins.
+    """
+    best = _corrections(current, desired)
+    best_cost = plan_cost(best, max_datagram_size)
+
+    if best and len(desired) >= num_outputs:
+        candidates = [[("one_to_one",)]]
+        candidates += [[("all", input_num)] for input_num in sorted(set(desired.values()))]
+        for bulk in candidates:
+            base = apply_plan({}, bulk, num_outputs, num_inputs)
+            plan = bulk + _corrections(base, desired)
+            cost = plan_cost(plan, max_datagram_size)
+            if cost < best_cost:
+                best, best_cost = plan, cost
+    return best
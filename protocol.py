@@ -0,0 +1,114 @@
+"""
+Encodes matrix commands into the bytes that go on the wire.
+
+The matrix expects plain ASCII command text preceded by a single 0xFF byte. (The
+original implementation produced that byte by encoding to UTF-16 and keeping the
+low byte of each code unit, which left the low byte of the byte order mark in
+front of the command.) The command space is small and fixed, so encoded commands
+are cached and handed out as immutable `bytes`.
+
+Commands are the same tuples the planner uses:
+
+    ("route", input_port, output_port)   ->  "{in}V{out}."
+    ("all", input_port)                  ->  "{in}All"
+    ("one_to_one",)                      ->  "All#."
+    ("recall", preset_num)               ->  "Recall{NN}."
+    ("save", preset_num)                 ->  "Save{NN}."
+    ("status",)                          ->  "Status."
+
+The matrix answers a status query with one line per routed output, in the form
+"AV: {in}->{out}"; `parse_status` reads those replies.
+"""
+import re
+from functools import lru_cache
+
+PACKET_PREFIX = b"\xff"
+
+_COMMAND_RE = re.compile(r"(\d+)V(\d+)\.|Recall(\d+)\.|Save(\d+)\.|(All#\.)|(\d+)All|(Status\.)")
+_STATUS_RE = re.compile(r"(\d+)\s*->\s*(\d+)")
+
+
+@lru_cache(maxsize=None)
+def command_bytes(command):
+    """Returns the encoded command text (without the packet prefix) for a command tuple."""
+    kind = command[0]
+    if kind == "route":
+        text = f"{command[1]}V{command[2]}."
+    elif kind == "all":
+        text = f"{command[1]}All"
+    elif kind == "one_to_one":
+        text = "All#."
+    elif kind == "recall":
+        text = f"Recall{command[1]:02d}."
+    elif kind == "save":
+        text = f"Save{command[1]:02d}."
+    elif kind == "status":
+        text = "Status."
+    else:
+        raise ValueError(f"Unknown command: {command!r}")
+    return text.encode("ascii")
+
+
+@lru_cache(maxsize=None)
+def packet(command):
+    """Returns a complete datagram carrying a single command."""
+    return PACKET_PREFIX + command_bytes(command)
+
+
+def join_packet(commands):
+    """Returns one datagram carrying several commands back to back."""
+    return PACKET_PREFIX + b"".join([command_bytes(command) for command in commands])
+
+
+def encode(text):
+    """Encodes arbitrary command text into a datagram."""
+    return PACKET_PREFIX + text.encode("latin-1")
+
+
+def precompile(num_inputs=16, num_outputs=16, num_presets=32):
+    """Builds every command of a matrix of the given size up front."""
+    for input_num in range(1, num_inputs + 1):
+        packet(("all", input_num))
+        for output_num in range(1, num_outputs + 1):
+            packet(("route", input_num, output_num))
+    for preset_num in range(1, num_presets + 1):
+        packet(("recall", preset_num))
+        packet(("save", preset_num))
+    packet(("one_to_one",))
+
+
+def parse_packet(data):
+    """
+    Decodes a datagram back into command tuples, the way the matrix reads it.
+    Unrecognised text is skipped.
+    """
+    if data.startswith(PACKET_PREFIX):
+        data = data[len(PACKET_PREFIX):]
+    commands = []
+    for match in _COMMAND_RE.finditer(data.decode("latin-1")):
+        route_in, route_out, recall, save, one_to_one, all_in, status = match.groups()
+        if route_in is not None:
+            commands.append(("route", int(route_in), int(route_out)))
+        elif recall is not None:
+            commands.append(("recall", int(recall)))
+        elif save is not None:
+            commands.append(("save", int(save)))
+        elif one_to_one is not None:
+            commands.append(("one_to_one",))
+        elif status is not None:
+            commands.append(("status",))
+        else:
+            commands.append(("all", int(all_in)))
+    return commands
+
+
+def encode_status(routing):
+    """Encodes a status reply for `routing` (output -> input), as the matrix sends it."""
+    return "".join(
+        f"AV: {input_num:2d}->{output_num:2d}\r\n" for output_num, input_num in sorted(routing.items())
+    ).encode("ascii")
+
+
+def parse_status(data):
+    """Parses a status reply into a dict of output -> input."""
+    return {int(output_num): int(input_num) for input_num, output_num in _STATUS_RE.findall(data.decode("latin-1"))}
@@ -0,0 +1,63 @@
+"""
+Mirrors the matrix's real routing into the app by polling it for its state.
+"""
+import threading
+
+
+def diff_routing(routing, device_state):
+    """Returns the outputs (output -> input) where `device_state` differs from `routing`."""
+    return {
+        output_num: input_num
+        for output_num, input_num in device_state.items()
+        if routing.get(output_num) != input_num
+    }
+
+
+class StatePoller:
+    """
+    Queries the matrix for its routing every `interval` seconds from a background
+    thread. Whenever the device disagrees with `routing` (changes made from the
+    front panel, IR or another operator), `on_change(changes)` is called with only
+    the outputs that differ. The caller applies them; the poller never writes to
+    `routing` itself, because it is owned by the GUI thread.
+    """
+
+    def __init__(self, controller, routing, interval=5.0, on_change=None, timeout=0.5):
+        self.controller = controller
+        self.routing = routing
+        self.interval = interval
+        self.timeout = timeout
+        self.on_change = on_change
+        self._wake = threading.Event()
+        self._stopped = False
+        self._thread = threading.Thread(target=self._run, name="state-poller", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def poll_now(self):
+        self._wake.set()
+
+    def stop(self):
+        self._stopped = True
+        self._wake.set()
+
+    def poll(self):
+        """Queries the matrix once and returns the differing outputs (empty if none or no reply)."""
+        device_state = self.controller.query_state(self.timeout)
+        if not device_state:
+            return {}
+        return diff_routing(self.routing, device_state)
+
+    def _run(self):
+        while not self._stopped:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            if self._stopped:
+                break
+            try:
+                changes = self.poll()
+            except OSError:
+                continue
+            if changes and self.on_change:
+                self.on_change(changes)
@@ -0,0 +1,171 @@
+"""
+The single, shared routing state of the matrix (which input feeds each output).
+"""
+from array import array
+from collections.abc import MutableMapping
+
+UNROUTED = 0
+# Inputs and outputs are stored as unsigned shorts.
+MAX_PORT_NUMBER = 65535
+
+
+def _check_route(output_num, input_num):
+    """Raises KeyError for an output, or ValueError for an input, that cannot be stored."""
+    if not 1 <= output_num <= MAX_PORT_NUMBER:
+        raise KeyError(output_num)
+    if not 1 <= input_num <= MAX_PORT_NUMBER:
+        raise ValueError(f"Input {input_num} is outside 1..{MAX_PORT_NUMBER}")
+
+
+class RoutingState(MutableMapping):
+    """
+    Output -> input routing backed by an array with one small int per output,
+    plus a maintained reverse index of input -> outputs.
+
+    It behaves like the plain `output_mappings` dict it replaces (int keys, e.g.
+    `state[5] = 3`, `state.get(5)`, `5 in state`), so existing code keeps working,
+    while route/unroute/lookup and "which outputs carry input N" are O(1).
+    """
+
+    def __init__(self, num_outputs=16, mappings=None):
+        self._inputs = array("H", [UNROUTED] * (num_outputs + 1))  # index 0 is unused
+        self._outputs_by_input = {}
+        self._count = 0
+        # Called as listener(output_num, input_num) on every change; input_num is None when unrouted.
+        self._listeners = []
+        if mappings:
+            self.update(mappings)
+
+    @classmethod
+    def from_json(cls, data, num_outputs=16):
+        """Builds a state from the `output_mappings` format stored in config.json (string keys)."""
+        return cls(num_outputs, {int(k): int(v) for k, v in data.items()})
+
+    def to_json(self):
+        """Returns the `output_mappings` format stored in config.json and I/O map files."""
+        return {str(output_num): input_num for output_num, input_num in self.items()}
+
+    def add_listener(self, listener):
+        """Registers `listener(output_num, input_num)` to be called, on the mutating thread, for every change."""
+        self._listeners.append(listener)
+
+    def remove_listener(self, listener):
+        self._listeners.remove(listener)
+
+    def _notify(self, output_num, input_num):
+        for listener in self._listeners:
+            listener(output_num, input_num)
+
+    @property
+    def num_outputs(self):
+        return len(self._inputs) - 1
+
+    def route(self, output_num, input_num):
+        """
+        Routes `input_num` to `output_num`, returning the input it replaced (or None).
+        Raises KeyError for an output below 1 and ValueError for an input outside 1..65535.
+        """
+        _check_route(output_num, input_num)
+        if output_num >= len(self._inputs):
+            self._inputs.extend([UNROUTED] * (output_num + 1 - len(self._inputs)))
+        previous = self._inputs[output_num]
+        if previous == input_num:
+            return previous
+        if previous == UNROUTED:
+            self._count += 1
+        else:
+            self._outputs_by_input[previous].discard(output_num)
+        self._inputs[output_num] = input_num
+        self._outputs_by_input.setdefault(input_num, set()).add(output_num)
+        if self._listeners:
+            self._notify(output_num, input_num)
+        return previous or None
+
+    def unroute(self, output_num):
+        """Clears `output_num`, returning the input it carried (or None)."""
+        previous = self.input_for(output_num)
+        if previous is not None:
+            self._inputs[output_num] = UNROUTED
+            self._outputs_by_input[previous].discard(output_num)
+            self._count -= 1
+            if self._listeners:
+                self._notify(output_num, None)
+        return previous
+
+    def input_for(self, output_num):
+        """Returns the input routed to `output_num`, or None."""
+        if 0 < output_num < len(self._inputs):
+            return self._inputs[output_num] or None
+        return None
+
+    def outputs_for(self, input_num):
+        """Returns the outputs currently carrying `input_num`."""
+        return frozenset(self._outputs_by_input.get(input_num, ()))
+
+    def replace(self, mappings):
+        """
+        Replaces the whole routing in place, so every holder of this object sees the change.
+        `mappings` is validated first; if any route is invalid the state is left untouched.
+        """
+        mappings = dict(mappings)
+        for output_num, input_num in mappings.items():
+            _check_route(output_num, input_num)
+        inputs = array("H", [UNROUTED] * max(len(self._inputs), max(mappings, default=0) + 1))
+        outputs_by_input = {}
+        for output_num, input_num in mappings.items():
+            inputs[output_num] = input_num
+            outputs_by_input.setdefault(input_num, set()).add(output_num)
+        previous = self._inputs
+        self._inputs = inputs
+        self._outputs_by_input = outputs_by_input
+        self._count = len(mappings)
+        if self._listeners:
+            for output_num in range(1, len(inputs)):
+                old = previous[output_num] if output_num < len(previous) else UNROUTED
+                if old != inputs[output_num]:
+                    self._notify(output_num, inputs[output_num] or None)
+
+    def clear(self):
+        routed = list(self) if self._listeners else ()
+        self._inputs = array("H", [UNROUTED] * len(self._inputs))
+        self._outputs_by_input = {}
+        self._count = 0
+        for output_num in routed:
+            self._notify(output_num, None)
+
+    def snapshot(self):
+        """Returns an immutable, hashable copy of the routing; snapshots compare with ==."""
+        return bytes(self._inputs)
+
+    def restore(self, snapshot):
+        """Restores a routing captured by `snapshot()`."""
+        restored = array("H")
+        restored.frombytes(snapshot)
+        self.replace({o: i for o, i in enumerate(restored) if o and i != UNROUTED})
+
+    def __getitem__(self, output_num):
+        input_num = self.input_for(output_num)
+        if input_num is None:
+            raise KeyError(output_num)
+        return input_num
+
+    def __setitem__(self, output_num, input_num):
+        self.route(output_num, input_num)
+
+    def __delitem__(self, output_num):
+        if self.unroute(output_num) is None:
+            raise KeyError(output_num)
+
+    def __iter__(self):
+        return (output_num for output_num, input_num in enumerate(self._inputs) if output_num and input_num)
+
+    def __len__(self):
+        return self._count
+
+    def __eq__(self, other):
+        if isinstance(other, RoutingState):
+            return dict(self.items()) == dict(other.items())
+        return super().__eq__(other)
+
+    def __repr__(self):
+        return f"RoutingState({dict(self.items())!r})"
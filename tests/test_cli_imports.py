@@ -0,0 +1,29 @@
+"""
+The command line tool runs on machines without a display (cron, show control), so
+importing it must not pull in PyQt5 or any other GUI-only or unused dependency.
+"""
+import subprocess
+import sys
+import unittest
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+CHECK = """
+import sys
+import hdmi_matrix
+loaded = sorted(name for name in sys.modules if name.split(".")[0] in ("PyQt5", "requests"))
+print(",".join(loaded))
+"""
+
+
+class CliImportTest(unittest.TestCase):
+    def test_hdmi_matrix_does_not_import_qt(self):
+        result = subprocess.run(
+            [sys.executable, "-c", CHECK], cwd=REPO_ROOT, capture_output=True, text=True, check=True
+        )
+        self.assertEqual(result.stdout.strip(), "", f"hdmi_matrix imported: {result.stdout.strip()}")
+
+
+if __name__ == "__main__":
+    unittest.main()
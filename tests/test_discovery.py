@@ -0,0 +1,50 @@
+"""
+Discovery against emulated matrices on loopback addresses (127.0.0.0/8 is all local
+on Linux), standing in for matrices on a LAN subnet.
+"""
+import asyncio
+import sys
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import discovery
+from emulator import MatrixEmulator
+
+
+class DiscoveryTest(unittest.TestCase):
+    def setUp(self):
+        try:
+            first = MatrixEmulator(host="127.0.0.2").start()
+        except OSError:
+            self.skipTest("loopback addresses other than 127.0.0.1 are not available")
+        self.port = first.address[1]
+        second = MatrixEmulator(host="127.0.0.5", port=self.port).start()
+        second.routing = {1: 2, 2: 2, 3: 4}
+        self.emulators = [first, second]
+
+    def tearDown(self):
+        for emulator in self.emulators:
+            emulator.stop()
+
+    def test_finds_every_matrix_that_answers(self):
+        scan = asyncio.run(discovery.discover("127.0.0.0/29", self.port, timeout=0.3))
+        self.assertTrue(scan.complete)
+        self.assertEqual(scan.hosts, 6)
+        self.assertEqual([(m.ip, m.port) for m in scan.matrices],
+                         [("127.0.0.2", self.port), ("127.0.0.5", self.port)])
+        self.assertEqual(scan.matrices[1].outputs, 3)
+
+    def test_deadline_cuts_the_scan_short(self):
+        scan = asyncio.run(discovery.discover("127.0.0.0/28", self.port, concurrency=1, timeout=0.3, deadline=0.5))
+        self.assertFalse(scan.complete)
+        self.assertLess(scan.probed, scan.hosts)
+
+    def test_rejects_networks_larger_than_a_slash_16(self):
+        with self.assertRaises(ValueError):
+            discovery.network_hosts("10.0.0.0/15")
+
+
+if __name__ == "__main__":
+    unittest.main()
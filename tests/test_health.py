@@ -0,0 +1,54 @@
+"""
+ICMP replies come with or without their IP header depending on the socket type and
+platform (raw sockets and macOS datagram sockets include it, Linux ping sockets do not).
+"""
+import struct
+import sys
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import health
+
+IDENT = 0x1234
+
+
+def echo_reply(ident=IDENT, icmp_type=health.ICMP_ECHO_REPLY):
+    return struct.pack("!BBHHH", icmp_type, 0, 0, ident, 1) + b"hdmi-matrix-ctrl"
+
+
+def ip_header(length=20):
+    # Version 4, header length in 32-bit words, then the rest of the header zeroed.
+    return bytes([0x40 | length // 4]) + bytes(length - 1)
+
+
+class EchoReplyTest(unittest.TestCase):
+    def test_reply_without_ip_header(self):
+        self.assertTrue(health._is_echo_reply(echo_reply(), IDENT))
+
+    def test_linux_ping_socket_rewrites_the_identifier(self):
+        self.assertTrue(health._is_echo_reply(echo_reply(ident=0x9999), IDENT))
+
+    def test_reply_with_ip_header(self):
+        self.assertTrue(health._is_echo_reply(ip_header() + echo_reply(), IDENT))
+        self.assertTrue(health._is_echo_reply(ip_header(24) + echo_reply(), IDENT))
+
+    def test_reply_with_ip_header_to_another_process(self):
+        self.assertFalse(health._is_echo_reply(ip_header() + echo_reply(ident=0x9999), IDENT))
+
+    def test_other_icmp_messages_and_short_packets(self):
+        self.assertFalse(health._is_echo_reply(echo_reply(icmp_type=health.ICMP_ECHO_REQUEST), IDENT))
+        self.assertFalse(health._is_echo_reply(ip_header() + b"\0\0\0", IDENT))
+        self.assertFalse(health._is_echo_reply(b"", IDENT))
+
+    def test_probe_loopback(self):
+        try:
+            rtt = health.icmp_probe("127.0.0.1", timeout=1.0)
+        except PermissionError:
+            self.skipTest("no ICMP socket available to this process")
+        self.assertIsNotNone(rtt)
+
+
+if __name__ == "__main__":
+    unittest.main()
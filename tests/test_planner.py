@@ -0,0 +1,118 @@
+"""
+The sync planner should send the fewest packets (then bytes) that reach the desired
+routing, and model each command the way the device applies it.
+"""
+import sys
+import time
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from emulator import MatrixEmulator
+from matrix_controller import MatrixController
+from planner import apply_plan, pack_commands, plan_cost, plan_sync
+
+
+def diagonal(num_outputs):
+    return {n: n for n in range(1, num_outputs + 1)}
+
+
+class PlanSyncTest(unittest.TestCase):
+    def assertReaches(self, current, desired, plan, num_outputs=16, num_inputs=None):
+        result = apply_plan(current, plan, num_outputs, num_inputs)
+        self.assertEqual({o: result.get(o) for o in desired}, desired)
+
+    def test_unchanged_state_sends_nothing(self):
+        self.assertEqual(plan_sync(diagonal(16), diagonal(16)), [])
+
+    def test_single_change_routes_one_output(self):
+        desired = {**diagonal(16), 5: 3}
+        self.assertEqual(plan_sync(diagonal(16), desired), [("route", 3, 5)])
+
+    def test_unknown_outputs_are_resent(self):
+        current = diagonal(16)
+        del current[7]
+        self.assertEqual(plan_sync(current, diagonal(16)), [("route", 7, 7)])
+
+    def test_all_plus_corrections(self):
+        desired = {n: 2 for n in range(1, 17)}
+        desired[1] = 3
+        plan = plan_sync({}, desired)
+        self.assertEqual(plan, [("all", 2), ("route", 3, 1)])
+        self.assertReaches({}, desired, plan)
+
+    def test_one_to_one_plus_corrections(self):
+        desired = {**diagonal(16), 16: 1}
+        plan = plan_sync({}, desired)
+        self.assertEqual(plan, [("one_to_one",), ("route", 1, 16)])
+        self.assertReaches({}, desired, plan)
+
+    def test_bulk_is_only_used_when_it_is_cheaper(self):
+        current = {n: 1 for n in range(1, 17)}
+        desired = {**current, 4: 2, 9: 2}
+        self.assertEqual(plan_sync(current, desired), [("route", 2, 4), ("route", 2, 9)])
+
+    def test_partial_desired_state_never_uses_bulk(self):
+        plan = plan_sync({}, {n: 2 for n in range(1, 16)})
+        self.assertNotIn(("all", 2), plan)
+        self.assertEqual(len(plan), 15)
+
+    def test_one_to_one_on_a_non_square_matrix(self):
+        desired = {**diagonal(8), **{n: 1 for n in range(9, 17)}}
+        plan = plan_sync({}, desired, num_outputs=16, num_inputs=8)
+        self.assertReaches({}, desired, plan, num_outputs=16, num_inputs=8)
+        self.assertTrue(all(command[1] <= 8 for command in plan if command[0] in ("route", "all")))
+
+
+class ApplyPlanTest(unittest.TestCase):
+    def test_one_to_one_only_maps_outputs_with_a_matching_input(self):
+        self.assertEqual(apply_plan({12: 3}, [("one_to_one",)], num_outputs=12, num_inputs=8), diagonal(8))
+        self.assertEqual(apply_plan({}, [("one_to_one",)], num_outputs=4, num_inputs=8), diagonal(4))
+
+    def test_controller_matches_the_emulator_on_a_non_square_matrix(self):
+        with MatrixEmulator(num_inputs=8, num_outputs=12) as emulator:
+            controller = MatrixController(*emulator.address, num_inputs=8, num_outputs=12, min_packet_gap=0)
+            try:
+                controller.route_many({12: 3})
+                controller.route_1_to_1()
+                deadline = time.monotonic() + 2
+                while emulator.snapshot() != controller.known_state and time.monotonic() < deadline:
+                    time.sleep(0.01)
+                self.assertEqual(emulator.snapshot(), controller.known_state)
+                self.assertEqual(controller.known_state, diagonal(8))
+            finally:
+                controller.close()
+
+
+class PackCommandsTest(unittest.TestCase):
+    def test_routes_share_datagrams_up_to_the_size_limit(self):
+        commands = [("route", 16, n) for n in range(1, 17)]
+        for max_size in (16, 32, 64, 1400):
+            packets = pack_commands(commands, max_size)
+            self.assertTrue(all(len(p) <= max_size for p in packets), max_size)
+            self.assertEqual(b"".join(p[1:] for p in packets), b"".join(f"16V{n}.".encode() for n in range(1, 17)))
+        self.assertEqual(len(pack_commands(commands, 1400)), 1)
+
+    def test_a_command_larger_than_the_limit_still_goes_out_alone(self):
+        self.assertEqual(pack_commands([("route", 10, 10), ("route", 11, 11)], 4), [b"\xff10V10.", b"\xff11V11."])
+
+    def test_bulk_commands_get_a_datagram_each(self):
+        commands = [("route", 1, 1), ("all", 2), ("route", 3, 3), ("one_to_one",)]
+        self.assertEqual(pack_commands(commands), [b"\xff1V1.", b"\xff2All", b"\xff3V3.", b"\xffAll#."])
+
+
+class PlanCostTest(unittest.TestCase):
+    def test_cost_is_packets_then_bytes(self):
+        self.assertEqual(plan_cost([("route", 1, 1), ("route", 2, 2)]), (1, 9))
+        self.assertEqual(plan_cost([("all", 1), ("route", 2, 2)]), (2, 10))
+
+    def test_fewer_packets_beat_fewer_bytes(self):
+        one_big_packet = [("route", 16, n) for n in range(10, 20)]
+        two_small_packets = [("all", 1), ("all", 2)]
+        self.assertGreater(plan_cost(one_big_packet)[1], plan_cost(two_small_packets)[1])
+        self.assertLess(plan_cost(one_big_packet), plan_cost(two_small_packets))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,62 @@
+"""
+State readback against the emulator, which answers status queries the way the
+matrix is expected to.
+"""
+import sys
+import threading
+import time
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from emulator import MatrixEmulator
+from matrix_controller import MatrixController
+from readback import StatePoller
+
+
+class ReadbackTest(unittest.TestCase):
+    def setUp(self):
+        self.emulator = MatrixEmulator(num_inputs=8, num_outputs=8).start()
+        self.emulator.routing = {1: 1, 2: 2, 3: 5}
+        self.controller = MatrixController(*self.emulator.address, num_inputs=8, num_outputs=8, min_packet_gap=0)
+
+    def tearDown(self):
+        self.controller.close()
+        self.emulator.stop()
+
+    def test_query_state_returns_the_device_routing(self):
+        self.assertEqual(self.controller.query_state(timeout=1.0), {1: 1, 2: 2, 3: 5})
+
+    def test_poll_reports_only_differing_outputs(self):
+        poller = StatePoller(self.controller, {1: 1, 2: 2, 3: 3, 4: 4}, timeout=1.0)
+        self.assertEqual(poller.poll(), {3: 5})
+        poller.routing = {1: 1, 2: 2, 3: 5}
+        self.assertEqual(poller.poll(), {})
+
+    def test_reply_is_dropped_if_a_command_was_sent_meanwhile(self):
+        self.emulator.latency = 0.2
+        sender = threading.Timer(0.05, self.controller.route, (4, 4))
+        sender.start()
+        try:
+            self.assertIsNone(self.controller.query_state(timeout=1.0))
+        finally:
+            sender.join()
+        poller = StatePoller(self.controller, {}, timeout=1.0)
+        sender = threading.Timer(0.05, self.controller.route, (6, 6))
+        sender.start()
+        try:
+            self.assertEqual(poller.poll(), {})
+        finally:
+            sender.join()
+        # With nothing sent during the query, the routed outputs come back as usual.
+        time.sleep(0.3)
+        self.assertEqual(self.controller.query_state(timeout=1.0), {1: 1, 2: 2, 3: 5, 4: 4, 6: 6})
+
+    def test_no_reply(self):
+        self.emulator.stop()
+        self.assertEqual(StatePoller(self.controller, {}, timeout=0.2).poll(), {})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,123 @@
+"""
+Lightweight span tracing, to see where the time of a click goes (confirm dialog,
+routing, socket send, config write, repaint).
+
+    with tracing.span("perform_route", output=5):
+        ...
+
+    @tracing.traced()
+    def on_output_selected(self, output_num):
+        ...
+
+Tracing is off by default, and a disabled span is a single flag check. When
+enabled, finished spans go into a ring buffer that `dump_chrome_trace` writes in
+the Chrome trace event format; open the file in chrome://tracing or Perfetto.
+"""
+import collections
+import functools
+import json
+import os
+import threading
+import time
+
+_enabled = False
+_events = collections.deque(maxlen=20000)
+
+
+def enable(capacity=20000):
+    """Starts recording spans into a ring buffer holding the last `capacity` spans."""
+    global _enabled, _events
+    if _events.maxlen != capacity:
+        _events = collections.deque(_events, maxlen=capacity)
+    _enabled = True
+
+
+def disable():
+    global _enabled
+    _enabled = False
+
+
+def is_enabled():
+    return _enabled
+
+
+def clear():
+    _events.clear()
+
+
+class _Span:
+    __slots__ = ("name", "args", "start")
+
+    def __init__(self, name, args):
+        self.name = name
+        self.args = args
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc):
+        end = time.perf_counter_ns()
+        thread = threading.current_thread()
+        _events.append((self.name, self.start, end - self.start, thread.ident, thread.name, self.args))
+        return False
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+def span(name, **args):
+    """Returns a context manager that records how long its block took (if tracing is enabled)."""
+    if not _enabled:
+        return _NULL_SPAN
+    return _Span(name, args)
+
+
+def traced(name=None):
+    """Decorates a function so every call is recorded as a span named after it."""
+    def decorate(func):
+        span_name = name or func.__qualname__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return func(*args, **kwargs)
+            with _Span(span_name, {}):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def chrome_trace():
+    """Returns the recorded spans as a Chrome trace event dict."""
+    pid = os.getpid()
+    events = list(_events)
+    trace_events = []
+    thread_names = {}
+    for name, start, duration, tid, thread_name, args in events:
+        thread_names[tid] = thread_name
+        trace_events.append({
+            "name": name, "ph": "X", "pid": pid, "tid": tid,
+            "ts": start / 1000, "dur": duration / 1000, "args": {k: str(v) for k, v in args.items()},
+        })
+    for tid, thread_name in thread_names.items():
+        trace_events.append({"name": "thread_name", "ph": "M", "pid": pid, "tid": tid, "args": {"name": thread_name}})
+    return {"traceEvents": trace_events, "displayTimeUnit": "ms"}
+
+
+def dump_chrome_trace(path):
+    """Writes the recorded spans to `path` as Chrome trace JSON. Returns the number of spans."""
+    trace = chrome_trace()
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(trace, f)
+    return sum(1 for event in trace["traceEvents"] if event["ph"] == "X")
@@ -2,21 +2,25 @@ from PyQt5.QtWidgets import (
     QWidget,
     QVBoxLayout,
     QHBoxLayout,
-    QGridLayout,
     QPushButton,
     QGroupBox,
-    QSizePolicy,
     QLabel,
 )
-from PyQt5.QtCore import Qt
+from ui.routing_grid import RoutingGridView, RoutingListModel
+from ui.routing_view_model import RoutingViewModel
 
 
 class IoTab(QWidget):
     def __init__(self, parent):
         super().__init__(parent)
         self.parent = parent
-        self.input_buttons = []
-        self.output_buttons = []
+        self.num_inputs = parent.settings["num_inputs"]
+        self.num_outputs = parent.settings["num_outputs"]
+        self.input_model = RoutingListModel(self.num_inputs, self)
+        self.output_model = RoutingListModel(self.num_outputs, self)
+        self.view_model = RoutingViewModel(self.num_inputs, self.num_outputs, self)
+        self.view_model.input_changed.connect(self.input_model.set_cell)
+        self.view_model.output_changed.connect(self.output_model.set_cell)
         self.init_ui()
 
     def init_ui(self):
@@ -24,39 +28,25 @@ class IoTab(QWidget):
 
         # Input Panel
         input_group = QGroupBox("Inputs")
-        input_layout = QGridLayout()
+        input_layout = QVBoxLayout()
         input_group.setLayout(input_layout)
         io_layout.addWidget(input_group)
 
-        for i in range(16):
-            button = QPushButton()
-            button.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Expanding)
-            button.setMinimumSize(100, 50)
-            button.clicked.connect(lambda _, num=i: self.parent.on_input_selected(num + 1))
-            button.setContextMenuPolicy(Qt.CustomContextMenu)
-            button.customContextMenuRequested.connect(
-                lambda pos, num=i: self.parent.on_input_context_menu(pos, num + 1)
-            )
-            self.input_buttons.append(button)
-            input_layout.addWidget(button, i // 8, i % 8)
+        self.input_view = RoutingGridView(self.input_model)
+        self.input_view.cell_clicked.connect(self.parent.on_input_selected)
+        self.input_view.cell_context_menu.connect(self.parent.on_input_context_menu)
+        input_layout.addWidget(self.input_view)
 
         # Output Panel
         output_group = QGroupBox("Outputs")
-        output_layout = QGridLayout()
+        output_layout = QVBoxLayout()
         output_group.setLayout(output_layout)
         io_layout.addWidget(output_group)
 
-        for i in range(16):
-            button = QPushButton()
-            button.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Expanding)
-            button.setMinimumSize(100, 50)
-            button.clicked.connect(lambda _, num=i: self.parent.on_output_selected(num + 1))
-            button.setContextMenuPolicy(Qt.CustomContextMenu)
-            button.customContextMenuRequested.connect(
-                lambda pos, num=i: self.parent.on_output_context_menu(pos, num + 1)
-            )
-            self.output_buttons.append(button)
-            output_layout.addWidget(button, i // 8, i % 8)
+        self.output_view = RoutingGridView(self.output_model)
+        self.output_view.cell_clicked.connect(self.parent.on_output_selected)
+        self.output_view.cell_context_menu.connect(self.parent.on_output_context_menu)
+        output_layout.addWidget(self.output_view)
 
         # Status Bar
         status_bar_layout = QHBoxLayout()
@@ -69,6 +59,7 @@ class IoTab(QWidget):
         status_bar_layout.addStretch(1)
 
         self.connection_status_label = QLabel("Status: Unknown")
+        self.connection_status_label.setObjectName("connectionStatus")
         status_bar_layout.addWidget(self.connection_status_label)
 
         self.retry_button = QPushButton("Retry")
@@ -83,38 +74,32 @@ class IoTab(QWidget):
         status_bar_layout.addWidget(self.ip_address_label)
 
     def update_button_names(self, input_names, output_names, output_mappings):
-        for i, button in enumerate(self.input_buttons):
-            name = input_names.get(str(i + 1))
-            if name:
-                button.setText(f"{name}\n(Input {i + 1})")
-            else:
-                button.setText(f"Input {i + 1}")
-
-        for i, button in enumerate(self.output_buttons):
-            output_num = i + 1
-            name = output_names.get(str(output_num))
-            
-            base_text = f"{name}\n(Output {output_num})" if name else f"Output {output_num}"
-
-            if output_num in output_mappings:
-                input_num_for_output = output_mappings[output_num]
-                base_text += f"\n<-- Input {input_num_for_output}"
-            
-            button.setText(base_text)
+        self.view_model.set_names(input_names, output_names)
+        self.view_model.set_routing(
+            output_mappings, self.view_model.selected_input, self.view_model.clicked_output
+        )
 
     def update_output_button_styles(self, output_mappings, selected_input, clicked_output_num=None):
-        for i, button in enumerate(self.output_buttons):
-            output_num = i + 1
-            if output_num == clicked_output_num:
-                button.setStyleSheet("background-color: #ebcb8b;") # Yellow for clicked output
-            elif output_mappings.get(output_num) == selected_input:
-                button.setStyleSheet("background-color: #88c0d0;") # Light blue for connected outputs
-            else:
-                button.setStyleSheet("")
-
-    def set_connection_status(self, text, color, show_retry):
-        self.connection_status_label.setText(text)
-        self.connection_status_label.setStyleSheet(color)
+        self.view_model.set_routing(output_mappings, selected_input, clicked_output_num)
+
+    def set_selected_input(self, input_num):
+        self.view_model.set_selected_input(input_num)
+
+    def set_clicked_output(self, output_num):
+        self.view_model.set_clicked_output(output_num)
+
+    def refresh_outputs(self, output_nums):
+        self.view_model.refresh_outputs(output_nums)
+
+    def set_connection_status(self, text, status, show_retry):
+        """`status` is "connected", "disconnected" or "" and is styled by the theme stylesheet."""
+        label = self.connection_status_label
+        label.setText(text)
+        if label.property("status") != status:
+            label.setProperty("status", status)
+            # Only this label is re-polished to pick up the rules for its new status.
+            label.style().unpolish(label)
+            label.style().polish(label)
         self.retry_button.setVisible(show_retry)
 
     def set_last_command_text(self, text):
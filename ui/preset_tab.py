@@ -1,3 +1,4 @@
+from PyQt5.QtCore import QEvent
 from PyQt5.QtWidgets import (
     QWidget,
     QVBoxLayout,
@@ -6,6 +7,7 @@ from PyQt5.QtWidgets import (
     QPushButton,
     QSizePolicy,
     QRadioButton,
+    QLabel,
 )
 
 
@@ -14,7 +16,10 @@ class PresetTab(QWidget):
         super().__init__(parent)
         self.parent = parent
         self.recall_radio = None
+        self.recall_diff_radio = None
         self.store_radio = None
+        self.preview_label = None
+        self.preset_buttons = {}
         self.init_ui()
 
     def init_ui(self):
@@ -27,21 +32,44 @@ class PresetTab(QWidget):
         self.recall_radio.setChecked(True)
         preset_mode_layout.addWidget(self.recall_radio)
 
+        self.recall_diff_radio = QRadioButton("Recall (changes only)")
+        self.recall_diff_radio.setToolTip("Send only the outputs that differ from the current routing")
+        preset_mode_layout.addWidget(self.recall_diff_radio)
+
         self.store_radio = QRadioButton("Store")
         preset_mode_layout.addWidget(self.store_radio)
 
         preset_grid = QGridLayout()
         preset_layout.addLayout(preset_grid)
 
-        for i in range(32):
+        for i in range(self.parent.settings["num_presets"]):
             button = QPushButton(f"Preset {i + 1}")
             button.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Expanding)
             button.setMinimumSize(100, 50)
             button.clicked.connect(lambda _, num=i: self.parent.on_preset_selected(num + 1))
+            button.installEventFilter(self)
+            self.preset_buttons[button] = i + 1
             preset_grid.addWidget(button, i // 8, i % 8)
 
+        # Shows what a preset contains while hovering it; this is read from the saved
+        # snapshots and never touches the network.
+        self.preview_label = QLabel("Hover a preset to preview its routing.")
+        self.preview_label.setWordWrap(True)
+        preset_layout.addWidget(self.preview_label)
+
+    def eventFilter(self, obj, event):
+        if event.type() == QEvent.Enter and obj in self.preset_buttons:
+            self.show_preview(self.preset_buttons[obj])
+        return super().eventFilter(obj, event)
+
+    def show_preview(self, preset_num):
+        self.preview_label.setText(self.parent.describe_preset(preset_num))
+
     def is_recall_selected(self):
         return self.recall_radio.isChecked()
 
+    def is_recall_diff_selected(self):
+        return self.recall_diff_radio.isChecked()
+
     def is_store_selected(self):
         return self.store_radio.isChecked()
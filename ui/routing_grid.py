@@ -0,0 +1,145 @@
+from PyQt5.QtWidgets import (
+    QListView,
+    QStyledItemDelegate,
+    QStyle,
+    QAbstractItemView,
+)
+from PyQt5.QtCore import Qt, QAbstractListModel, QModelIndex, QRectF, QSize, pyqtProperty, pyqtSignal
+from PyQt5.QtGui import QColor, QPalette, QPen
+
+# Defaults; the theme stylesheet sets the colors through RoutingGridView's
+# qproperty-selectedColor, -clickedColor, -routedColor and -highlightTextColor.
+STATE_COLORS = {
+    "selected": QColor("#a3be8c"),  # Green for selected input
+    "clicked": QColor("#ebcb8b"),  # Yellow for clicked output
+    "routed": QColor("#88c0d0"),  # Light blue for connected outputs
+}
+HIGHLIGHT_TEXT_COLOR = QColor("#2e3440")
+STATE_ROLE = Qt.UserRole + 1
+
+
+class RoutingListModel(QAbstractListModel):
+    """
+    One row per input or output: its label and highlight state. Rows are plain
+    Python data, so a 72x72 matrix costs a few lists instead of 144 widgets.
+    """
+
+    def __init__(self, count, parent=None):
+        super().__init__(parent)
+        self._labels = [""] * count
+        self._states = [""] * count
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._labels)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        if role == Qt.DisplayRole:
+            return self._labels[index.row()]
+        if role == STATE_ROLE:
+            return self._states[index.row()]
+        return None
+
+    def set_cell(self, num, label, state):
+        """Updates the cell for input/output `num` (1-based) and repaints only that cell."""
+        row = num - 1
+        self._labels[row] = label
+        self._states[row] = state
+        index = self.index(row)
+        self.dataChanged.emit(index, index)
+
+
+class RoutingCellDelegate(QStyledItemDelegate):
+    """
+    Paints a cell as a flat, button-like tile with centered multi-line text, filled
+    with the color `state_colors` gives its highlight state.
+    """
+
+    def __init__(self, cell_size, parent=None):
+        super().__init__(parent)
+        self.cell_size = cell_size
+        self.state_colors = dict(STATE_COLORS)
+        self.highlight_text_color = QColor(HIGHLIGHT_TEXT_COLOR)
+
+    def sizeHint(self, option, index):
+        return self.cell_size
+
+    def paint(self, painter, option, index):
+        painter.save()
+        painter.setRenderHint(painter.Antialiasing)
+        rect = QRectF(option.rect).adjusted(2, 2, -2, -2)
+        fill = self.state_colors.get(index.data(STATE_ROLE))
+        text_color = self.highlight_text_color if fill is not None else option.palette.color(QPalette.Text)
+        if fill is None:
+            fill = option.palette.color(QPalette.AlternateBase)
+        if option.state & QStyle.State_MouseOver:
+            fill = fill.lighter(115)
+        painter.setPen(QPen(option.palette.color(QPalette.Mid)))
+        painter.setBrush(fill)
+        painter.drawRoundedRect(rect, 3, 3)
+        painter.setPen(text_color)
+        painter.drawText(rect, Qt.AlignCenter | Qt.TextWordWrap, index.data(Qt.DisplayRole) or "")
+        painter.restore()
+
+
+class RoutingGridView(QListView):
+    """
+    A virtualized grid of routing cells. Only visible cells are painted, and a
+    model change repaints just the affected cell.
+    """
+
+    cell_clicked = pyqtSignal(int)  # 1-based input/output number
+    cell_context_menu = pyqtSignal(object, int)  # global position, 1-based number
+
+    def __init__(self, model, cell_size=QSize(110, 64), parent=None):
+        super().__init__(parent)
+        self.setModel(model)
+        self._delegate = RoutingCellDelegate(cell_size, self)
+        self.setItemDelegate(self._delegate)
+        self.setViewMode(QListView.IconMode)
+        self.setFlow(QListView.LeftToRight)
+        self.setWrapping(True)
+        self.setResizeMode(QListView.Adjust)
+        self.setMovement(QListView.Static)
+        self.setUniformItemSizes(True)
+        self.setGridSize(cell_size)
+        self.setSelectionMode(QAbstractItemView.NoSelection)
+        self.setMouseTracking(True)
+        self.setMinimumHeight(cell_size.height() * 2 + 2 * self.frameWidth() + 4)
+        self.setContextMenuPolicy(Qt.CustomContextMenu)
+        self.clicked.connect(lambda index: self.cell_clicked.emit(index.row() + 1))
+        self.customContextMenuRequested.connect(self._on_context_menu)
+
+    # Highlight colors, set once from the stylesheet when the view is polished.
+
+    def _state_color(self, state):
+        return self._delegate.state_colors[state]
+
+    def _set_state_color(self, state, color):
+        self._delegate.state_colors[state] = QColor(color)
+        self.viewport().update()
+
+    selectedColor = pyqtProperty(
+        QColor, lambda self: self._state_color("selected"), lambda self, c: self._set_state_color("selected", c)
+    )
+    clickedColor = pyqtProperty(
+        QColor, lambda self: self._state_color("clicked"), lambda self, c: self._set_state_color("clicked", c)
+    )
+    routedColor = pyqtProperty(
+        QColor, lambda self: self._state_color("routed"), lambda self, c: self._set_state_color("routed", c)
+    )
+
+    def _highlight_text_color(self):
+        return self._delegate.highlight_text_color
+
+    def _set_highlight_text_color(self, color):
+        self._delegate.highlight_text_color = QColor(color)
+        self.viewport().update()
+
+    highlightTextColor = pyqtProperty(QColor, _highlight_text_color, _set_highlight_text_color)
+
+    def _on_context_menu(self, pos):
+        index = self.indexAt(pos)
+        if index.isValid():
+            self.cell_context_menu.emit(self.viewport().mapToGlobal(pos), index.row() + 1)
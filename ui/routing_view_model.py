@@ -0,0 +1,99 @@
+from PyQt5.QtCore import QObject, pyqtSignal
+from routing_state import RoutingState
+
+# Highlight states of a routing cell.
+SELECTED = "selected"  # The selected input
+CLICKED = "clicked"  # The output that was just routed
+ROUTED = "routed"  # Outputs fed by the selected input
+
+
+class RoutingViewModel(QObject):
+    """
+    Holds the label and highlight state of every routing cell and emits a change
+    signal only for the cells whose label or highlight actually changed, so the
+    view never has to repaint the whole grid.
+    """
+
+    input_changed = pyqtSignal(int, str, str)  # input number, label, highlight state
+    output_changed = pyqtSignal(int, str, str)  # output number, label, highlight state
+
+    def __init__(self, num_inputs=16, num_outputs=16, parent=None):
+        super().__init__(parent)
+        self.num_inputs = num_inputs
+        self.num_outputs = num_outputs
+        self.input_names = {}
+        self.output_names = {}
+        self.output_mappings = RoutingState(num_outputs)
+        self.selected_input = None
+        self.clicked_output = None
+        self._inputs = {}
+        self._outputs = {}
+
+    def set_names(self, input_names, output_names):
+        """Sets the custom names of the current preset (string keys, as stored in names.json)."""
+        self.input_names = dict(input_names)
+        self.output_names = dict(output_names)
+        self.refresh()
+
+    def set_routing(self, output_mappings, selected_input=None, clicked_output=None):
+        """Sets the shared RoutingState and highlights, recomputing every cell (for bulk changes)."""
+        self.output_mappings = output_mappings
+        self.selected_input = selected_input
+        self.clicked_output = clicked_output
+        self.refresh()
+
+    def set_selected_input(self, selected_input):
+        """Moves the input highlight; only the old and new input and the outputs they feed are recomputed."""
+        previous = self.selected_input
+        affected = set(self.output_mappings.outputs_for(previous)) | self.output_mappings.outputs_for(selected_input)
+        if self.clicked_output is not None:
+            affected.add(self.clicked_output)
+        self.selected_input = selected_input
+        self.clicked_output = None
+        self.refresh_inputs({previous, selected_input})
+        self.refresh_outputs(affected)
+
+    def set_clicked_output(self, output_num):
+        """Marks `output_num` as just routed; call after updating the routing state."""
+        affected = {self.clicked_output, output_num}
+        self.clicked_output = output_num
+        self.refresh_outputs(affected)
+
+    def refresh(self):
+        """Recomputes every cell and emits signals for the ones that changed."""
+        self.refresh_inputs(range(1, self.num_inputs + 1))
+        self.refresh_outputs(range(1, self.num_outputs + 1))
+
+    def refresh_inputs(self, input_nums):
+        """Recomputes the given input cells, e.g. after their routing changed elsewhere."""
+        for input_num in input_nums:
+            if input_num is None or not 1 <= input_num <= self.num_inputs:
+                continue
+            name = self.input_names.get(str(input_num))
+            label = f"{name}\n(Input {input_num})" if name else f"Input {input_num}"
+            state = SELECTED if input_num == self.selected_input else ""
+            cell = (label, state)
+            if self._inputs.get(input_num) != cell:
+                self._inputs[input_num] = cell
+                self.input_changed.emit(input_num, label, state)
+
+    def refresh_outputs(self, output_nums):
+        """Recomputes the given output cells, e.g. after their routing changed elsewhere."""
+        for output_num in output_nums:
+            if output_num is None or not 1 <= output_num <= self.num_outputs:
+                continue
+            name = self.output_names.get(str(output_num))
+            label = f"{name}\n(Output {output_num})" if name else f"Output {output_num}"
+            routed_input = self.output_mappings.input_for(output_num)
+            if routed_input is not None:
+                label += f"\n<-- Input {routed_input}"
+            if output_num == self.clicked_output:
+                state = CLICKED
+            elif routed_input is not None and routed_input == self.selected_input:
+                state = ROUTED
+            else:
+                state = ""
+            cell = (label, state)
+            if self._outputs.get(output_num) != cell:
+                self._outputs[output_num] = cell
+                self.output_changed.emit(output_num, label, state)
@@ -6,9 +6,15 @@ from PyQt5.QtWidgets import (
     QLabel,
     QLineEdit,
     QCheckBox,
+    QComboBox,
+    QHBoxLayout,
+    QListWidget,
+    QListWidgetItem,
 )
 from PyQt5.QtCore import Qt
 
+import discovery
+
 
 class SettingsTab(QWidget):
     def __init__(self, parent):
@@ -18,6 +24,12 @@ class SettingsTab(QWidget):
         self.port_input = None
         self.confirm_before_switch_checkbox = None
         self.theme_checkbox = None
+        self.feed_role_combo = None
+        self.feed_host_input = None
+        self.feed_port_input = None
+        self.network_input = None
+        self.discover_button = None
+        self.discovered_list = None
         self.init_ui()
 
     def init_ui(self):
@@ -33,6 +45,39 @@ class SettingsTab(QWidget):
         self.port_input = QLineEdit(str(self.parent.settings["port"]))
         settings_form_layout.addWidget(self.port_input, 1, 1)
 
+        # Sharing one matrix between several consoles; takes effect after a restart.
+        settings_form_layout.addWidget(QLabel("Console Role:"), 2, 0)
+        self.feed_role_combo = QComboBox()
+        for label, role in (("Standalone", "standalone"), ("Owner (publishes changes)", "owner"),
+                            ("Subscriber (follows an owner)", "subscriber")):
+            self.feed_role_combo.addItem(label, role)
+        self.feed_role_combo.setCurrentIndex(self.feed_role_combo.findData(self.parent.settings["feed_role"]))
+        settings_form_layout.addWidget(self.feed_role_combo, 2, 1)
+
+        settings_form_layout.addWidget(QLabel("Change Feed Address:"), 3, 0)
+        self.feed_host_input = QLineEdit(self.parent.settings["feed_host"])
+        settings_form_layout.addWidget(self.feed_host_input, 3, 1)
+
+        settings_form_layout.addWidget(QLabel("Change Feed Port:"), 4, 0)
+        self.feed_port_input = QLineEdit(str(self.parent.settings["feed_port"]))
+        settings_form_layout.addWidget(self.feed_port_input, 4, 1)
+
+        # Finding the matrix on the LAN instead of typing its address.
+        settings_form_layout.addWidget(QLabel("Discover in Subnet:"), 5, 0)
+        discover_layout = QHBoxLayout()
+        self.network_input = QLineEdit(discovery.local_network())
+        discover_layout.addWidget(self.network_input)
+        self.discover_button = QPushButton("Discover")
+        self.discover_button.clicked.connect(self.parent.discover_matrices)
+        discover_layout.addWidget(self.discover_button)
+        settings_form_layout.addLayout(discover_layout, 5, 1)
+
+        self.discovered_list = QListWidget()
+        self.discovered_list.setMaximumHeight(100)
+        self.discovered_list.hide()
+        self.discovered_list.itemDoubleClicked.connect(self.use_discovered)
+        settings_form_layout.addWidget(self.discovered_list, 6, 1)
+
         # Theme selection
         self.theme_checkbox = QCheckBox("Enable Dark Theme")
         self.theme_checkbox.setChecked(self.parent.settings.get("theme", "light") == "dark")
@@ -49,9 +94,14 @@ class SettingsTab(QWidget):
         settings_layout.addWidget(save_button)
 
         sync_button = QPushButton("Sync Current State to Matrix")
-        sync_button.clicked.connect(self.parent.sync_state_to_matrix)
+        sync_button.clicked.connect(lambda: self.parent.sync_state_to_matrix())
         settings_layout.addWidget(sync_button)
 
+        # Resends every output, for when the matrix no longer matches what we last sent.
+        force_sync_button = QPushButton("Force Full Sync")
+        force_sync_button.clicked.connect(lambda: self.parent.sync_state_to_matrix(force=True))
+        settings_layout.addWidget(force_sync_button)
+
         settings_layout.addStretch(1)
 
     def toggle_theme(self, state):
@@ -60,11 +110,47 @@ class SettingsTab(QWidget):
         else:
             self.parent.set_theme("light")
 
+    def set_discovering(self, discovering):
+        self.discover_button.setEnabled(not discovering)
+        self.discover_button.setText("Discovering..." if discovering else "Discover")
+
+    def show_discovered(self, scan):
+        """Lists the matrices a discovery scan found; double-clicking one saves it as the endpoint."""
+        self.discovered_list.clear()
+        for matrix in scan.matrices:
+            item = QListWidgetItem(f"{matrix.ip}:{matrix.port}  ({matrix.outputs} outputs reported, {matrix.rtt_ms:.0f} ms)")
+            item.setData(Qt.UserRole, (matrix.ip, matrix.port))
+            self.discovered_list.addItem(item)
+        if not scan.matrices:
+            self.discovered_list.addItem(
+                "No matrix answered a status query in this subnet. "
+                "Some models do not answer them; enter the address by hand."
+            )
+        if not scan.complete:
+            self.discovered_list.addItem(
+                f"Scan incomplete: only {scan.probed} of {scan.hosts} hosts were probed in time."
+            )
+        self.discovered_list.show()
+
+    def use_discovered(self, item):
+        endpoint = item.data(Qt.UserRole)
+        if endpoint is None:
+            return
+        self.ip_input.setText(endpoint[0])
+        self.port_input.setText(str(endpoint[1]))
+        self.parent.save_settings()
+
+    def get_network(self):
+        return self.network_input.text().strip()
+
     def get_ip_address(self):
         return self.ip_input.text()
 
     def get_port(self):
         return int(self.port_input.text())
 
+    def get_feed_settings(self):
+        return self.feed_role_combo.currentData(), self.feed_host_input.text(), int(self.feed_port_input.text())
+
     def get_confirm_before_switch_state(self):
         return self.confirm_before_switch_checkbox.isChecked()
@@ -1,13 +1,17 @@
-from PyQt5.QtCore import QThread, pyqtSignal
+from PyQt5.QtCore import QObject, pyqtSignal
 
 
-class ConnectivityChecker(QThread):
-    finished = pyqtSignal(bool)
+class GuiInvoker(QObject):
+    """Runs callables on the GUI thread, whichever thread asks for them."""
 
-    def __init__(self, controller):
-        super().__init__()
-        self.controller = controller
+    _invoke = pyqtSignal(object, tuple)
 
-    def run(self):
-        is_connected = self.controller.check_connection()
-        self.finished.emit(is_connected)
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._invoke.connect(self._run)
+
+    def call(self, func, *args):
+        self._invoke.emit(func, args)
+
+    def _run(self, func, args):
+        func(*args)